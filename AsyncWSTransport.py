@@ -0,0 +1,200 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import websockets
+
+from WSCodec import BinaryFrame
+
+
+class AsyncWSTransport:
+    """
+    Transport WebSocket asyncio (`websockets`) untuk WSClient.
+
+    Satu event loop (satu thread) menangani baca, tulis (menguras WSWriter),
+    heartbeat, poll SMS (jadwal dari sms.scheduler) dan reconnect (jeda dari
+    _next_reconnect_delay).
+    Kerja blocking (adb, termux-*, _on_message) jalan di executor kecil
+    supaya loop tidak pernah tertahan; WSClient.background() juga memakai
+    executor ini, bukan thread baru. Worker command dan CallAudioForwarder tetap
+    thread sendiri (adb berurutan / pipe blocking).
+
+    Callback ke client sama dengan mode websocket-client:
+    _on_open(ws), _on_message(ws, message), _on_close(ws, code, reason),
+    _on_error(ws, err).
+    """
+
+    def __init__(self, client, url, heartbeat_first=10, heartbeat_interval=1800,
+                 io_workers=2):
+        self.client = client
+        self.url = url
+        self.heartbeat_first = heartbeat_first
+        self.heartbeat_interval = heartbeat_interval
+
+        self.executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="ws-io")
+        self.loop = None
+        self.conn = None
+        self.deflate = False
+        self._wake = None
+        self._stopping = None
+        self._thread = None
+
+    # ==================================================
+    # THREAD API
+    # ==================================================
+    def start(self):
+        self._thread = threading.Thread(target=self._thread_main, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self.loop and self._stopping:
+            self.loop.call_soon_threadsafe(self._stopping.set)
+        self.executor.shutdown(wait=False)
+
+    def wake_writer(self):
+        """Dipanggil WSWriter dari thread mana pun saat ada pesan baru."""
+        if self.loop and self._wake:
+            self.loop.call_soon_threadsafe(self._wake.set)
+
+    def _thread_main(self):
+        asyncio.run(self._main())
+
+    async def blocking(self, fn, *args):
+        return await self.loop.run_in_executor(self.executor, fn, *args)
+
+    # ==================================================
+    # MAIN LOOP
+    # ==================================================
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self.client.writer.waker = self.wake_writer
+
+        tasks = [
+            asyncio.create_task(self._connect_loop()),
+            asyncio.create_task(self._writer_task()),
+            asyncio.create_task(self._heartbeat_task()),
+            asyncio.create_task(self._sms_task()),
+        ]
+        await self._stopping.wait()
+
+        if self.conn:
+            await self.conn.close()
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _connect_loop(self):
+        client = self.client
+        while not self._stopping.is_set():
+            code, reason = None, None
+            try:
+                client.reconnect_attempt += 1
+                client.log(f"Connecting to {self.url} (attempt {client.reconnect_attempt})")
+
+                async with websockets.connect(
+                    self.url, ping_interval=20, ping_timeout=15, max_size=None
+                ) as conn:
+                    response = getattr(conn, "response", None)
+                    headers = response.headers if response else getattr(conn, "response_headers", {})
+                    self.deflate = "permessage-deflate" in headers.get("Sec-WebSocket-Extensions", "")
+                    self.conn = conn
+
+                    await self.blocking(client._on_open, self)
+                    self._wake.set()
+
+                    # _on_message bisa tertahan di writer.put (antrian ack
+                    # penuh); di executor supaya _writer_task tetap menguras.
+                    # Di-await satu per satu: urutan pesan tetap
+                    async for message in conn:
+                        await self.blocking(client._on_message, self, message)
+
+                    code, reason = conn.close_code, conn.close_reason
+
+            except asyncio.CancelledError:
+                raise
+            except websockets.ConnectionClosed as e:
+                rcvd = getattr(e, "rcvd", None)
+                code, reason = (rcvd.code, rcvd.reason) if rcvd else (None, str(e))
+            except Exception as e:
+                client._on_error(self, e)
+            finally:
+                self.conn = None
+
+            client._on_close(self, code, reason)
+            if self._stopping.is_set():
+                break
+            delay = client._next_reconnect_delay()
+            client.log(f"Reconnecting in {delay:.1f} seconds...", "WARN")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    # ==================================================
+    # TASKS
+    # ==================================================
+    async def _writer_task(self):
+        """Kuras WSWriter; tanpa koneksi, pesan diteruskan ke on_fail (outbox)."""
+        writer = self.client.writer
+        while True:
+            self._wake.clear()
+            frames = writer.next_batch(timeout=0)
+            if not frames:
+                await self._wake.wait()
+                continue
+
+            for frame, msgs in frames:
+                ok = False
+                conn = self.conn
+                if conn is not None and self.client.ws_connected:
+                    try:
+                        if isinstance(frame, BinaryFrame):
+                            await conn.send(bytes(frame))
+                        else:
+                            await self._send_text(conn, frame)
+                        ok = True
+                    except Exception as e:
+                        print(f"⚠️ WS send failed: {e}")
+                writer.record(msgs, ok)
+
+    async def _send_text(self, conn, frame):
+        if isinstance(frame, (bytes, bytearray)):
+            try:
+                # websockets >= 13: bytes UTF-8 langsung sebagai frame teks
+                await conn.send(frame, text=True)
+                return
+            except TypeError:
+                frame = bytes(frame).decode("utf-8")
+        await conn.send(frame)
+
+    async def _heartbeat_task(self):
+        count = 0
+        while True:
+            await asyncio.sleep(self.heartbeat_first if count < 3 else self.heartbeat_interval)
+            try:
+                if not self.client.ws_connected:
+                    print("💤 Heartbeat skipped - WebSocket not connected")
+                    count += 1
+                    continue
+                payload = await self.blocking(self.client._build_heartbeat, count)
+                print(f"❤️ Sending heartbeat #{count}")
+                self.client.send(payload)
+                count += 1
+            except Exception as e:
+                print(f"💔 Heartbeat error: {e}")
+                await asyncio.sleep(60)
+
+    async def _sms_task(self):
+        sms = self.client.sms
+        wake = asyncio.Event()
+        sms.scheduler.waker = lambda: self.loop.call_soon_threadsafe(wake.set)
+        while True:
+            await self.blocking(sms.poll_once)
+            try:
+                # trigger() selama poll berjalan → poll lagi segera
+                await asyncio.wait_for(wake.wait(), sms.scheduler.next_delay())
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
@@ -1,9 +1,10 @@
 import subprocess
 import threading
 import base64
-import json
 import time
 
+from WSCodec import FRAME_AUDIO
+
 class CallAudioForwarder:
     def __init__(self, adb, ws_client, rate=16000, channels=1, use_root=False):
         self.adb = adb
@@ -15,6 +16,7 @@ class CallAudioForwarder:
         self.thread = None
         self.running = False
         self._stop_event = threading.Event()
+        self.seq = 0
   
     def start(self):
         if self.running:
@@ -43,23 +45,25 @@ class CallAudioForwarder:
                 chunk = self.proc.stdout.read(4096)
                 if not chunk:
                     break
-                payload = {
-                    "type": "audio_chunk",
-                    "format": "pcm16" if self.use_root else "amr_nb",
-                    "rate": self.rate,
-                    "channels": self.channels,
-                    "data": base64.b64encode(chunk).decode('ascii')
-                }
+                fmt = "pcm16" if self.use_root else "amr_nb"
+                self.seq += 1
                 try:
-                    if self.ws and hasattr(self.ws, "send"):
-                        try:
-                            self.ws.send(json.dumps(payload))
-                        except Exception:
-                            # fallback: try sending dict (WS client wrapper may handle it)
-                            try:
-                                self.ws.send(payload)
-                            except Exception:
-                                pass
+                    # frame biner jika server mendukung, selain itu JSON + base64
+                    if getattr(self.ws, "binary_enabled", False):
+                        self.ws.send_binary(
+                            FRAME_AUDIO, chunk,
+                            seq=self.seq, fmt=fmt, rate=self.rate, channels=self.channels
+                        )
+                    elif self.ws and hasattr(self.ws, "send"):
+                        # WSClient.send hanya mengantrikan; serialisasi di writer thread
+                        self.ws.send({
+                            "type": "audio_chunk",
+                            "format": fmt,
+                            "rate": self.rate,
+                            "channels": self.channels,
+                            "seq": self.seq,
+                            "data": base64.b64encode(chunk).decode('ascii')
+                        })
                 except Exception as e:
                     print("Audio send error:", e)
                     break
@@ -0,0 +1,103 @@
+import copy
+import threading
+
+
+def merge_patch_diff(old, new):
+    """
+    JSON merge patch (RFC 7396) yang mengubah old menjadi new:
+    dict di-diff rekursif, key yang hilang bernilai None, nilai lain diganti utuh.
+    """
+    patch = {}
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            sub = merge_patch_diff(old[key], value)
+            if sub:
+                patch[key] = sub
+        elif old[key] != value:
+            patch[key] = value
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch
+
+
+def apply_merge_patch(target, patch):
+    """Kebalikan merge_patch_diff (dipakai server / untuk uji)."""
+    result = dict(target)
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        elif isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = apply_merge_patch(result[key], value)
+        else:
+            result[key] = value
+    return result
+
+
+class HeartbeatDelta:
+    """
+    Encoder heartbeat delta.
+
+    Setiap heartbeat punya version. Keyframe membawa state lengkap; heartbeat
+    lain hanya membawa merge patch terhadap state versi terakhir yang di-ack
+    server (heartbeat_ack), jadi delta yang hilang tidak merusak state server.
+    Keyframe dikirim jika belum ada base yang di-ack, setiap keyframe_every
+    heartbeat, atau saat diminta (request_keyframe / reset setelah reconnect).
+    """
+
+    def __init__(self, keyframe_every=10, history=16):
+        self.keyframe_every = keyframe_every
+        self.history = history
+        self._lock = threading.Lock()
+        self.version = 0
+        self._sent = {}          # version -> state yang dikirim
+        self._base_version = None
+        self._since_keyframe = 0
+        self._force_keyframe = True
+
+    def encode(self, state):
+        """Return field heartbeat untuk state: keyframe atau delta."""
+        state = copy.deepcopy(state)
+        with self._lock:
+            self.version += 1
+            version = self.version
+            self._sent[version] = state
+            while len(self._sent) > self.history:
+                del self._sent[min(self._sent)]
+
+            base = self._sent.get(self._base_version) if self._base_version else None
+            keyframe = (
+                self._force_keyframe
+                or base is None
+                or self._since_keyframe >= self.keyframe_every
+            )
+
+            if keyframe:
+                self._force_keyframe = False
+                self._since_keyframe = 0
+                return {"version": version, "keyframe": True, "state": state}
+
+            self._since_keyframe += 1
+            return {
+                "version": version,
+                "base": self._base_version,
+                "delta": merge_patch_diff(base, state)
+            }
+
+    def ack(self, version):
+        """Server sudah menerapkan version; delta berikutnya relatif ke state ini."""
+        with self._lock:
+            if version in self._sent and (self._base_version is None or version > self._base_version):
+                self._base_version = version
+
+    def request_keyframe(self):
+        with self._lock:
+            self._force_keyframe = True
+
+    def reset(self):
+        """Lupakan base (mis. setelah reconnect, server mungkin kehilangan state)."""
+        with self._lock:
+            self._base_version = None
+            self._force_keyframe = True
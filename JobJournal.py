@@ -0,0 +1,218 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+
+class JobJournal:
+    """
+    Journal job command di SQLite supaya antrian tidak hilang saat
+    restart / update script / proses dibunuh Termux.
+
+    Status job: queued → started → finished (atau abandoned saat recover).
+    Semua tulis dikumpulkan oleh satu thread writer dan di-commit per batch,
+    jadi record()/mark_*() tidak menunggu disk.
+    """
+
+    REPLAY_AT_MOST_ONCE = "at-most-once"
+    REPLAY_RETRY = "retry"
+
+    def __init__(self, path, replay=REPLAY_AT_MOST_ONCE, max_attempts=3,
+                 flush_interval=0.2, batch_size=100, keep_finished=86400):
+        self.path = path
+        self.replay = replay if replay in (self.REPLAY_AT_MOST_ONCE, self.REPLAY_RETRY) \
+            else self.REPLAY_AT_MOST_ONCE
+        self.max_attempts = max_attempts
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.keep_finished = keep_finished
+
+        self._ops = queue.Queue()
+        self._flushed = threading.Condition()
+        self._seq_put = 0
+        self._seq_done = 0
+        self._running = False
+        self._thread = None
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " done INTEGER NOT NULL DEFAULT 0,"
+            " created REAL NOT NULL,"
+            " updated REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state)")
+        self._db.commit()
+
+    # ==================================================
+    # RECOVERY (dipanggil sekali saat startup, sebelum start())
+    # ==================================================
+    def recover(self):
+        """
+        Ambil job yang belum selesai dari run sebelumnya.
+        Return (replay, abandoned): list job dict.
+        - replay: job yang dimasukkan lagi ke antrian (item sisa saja)
+        - abandoned: job yang sempat jalan tapi tidak diulang (at-most-once
+          atau attempts habis), perlu dilaporkan gagal ke pengirim
+        """
+        replay, abandoned = [], []
+        now = time.time()
+
+        rows = self._db.execute(
+            "SELECT id, payload, state, attempts, done FROM jobs"
+            " WHERE state IN ('queued', 'started') ORDER BY created"
+        ).fetchall()
+
+        for job_id, payload, state, attempts, done in rows:
+            try:
+                job = json.loads(payload)
+            except Exception:
+                self._db.execute("UPDATE jobs SET state='abandoned', updated=? WHERE id=?", (now, job_id))
+                continue
+
+            job["items"] = job.get("items", [])[done:]
+
+            if not job["items"]:
+                self._db.execute("UPDATE jobs SET state='finished', updated=? WHERE id=?", (now, job_id))
+                continue
+
+            # simpan hanya item sisa, progress dihitung ulang dari 0
+            self._db.execute(
+                "UPDATE jobs SET payload=?, done=0 WHERE id=?",
+                (json.dumps(job), job_id)
+            )
+            job["id"] = job_id
+            job["attempts"] = attempts
+
+            retry = (
+                state == "queued"
+                or (self.replay == self.REPLAY_RETRY and attempts < self.max_attempts)
+            )
+
+            if retry:
+                replay.append(job)
+                self._db.execute("UPDATE jobs SET state='queued', updated=? WHERE id=?", (now, job_id))
+            else:
+                abandoned.append(job)
+                self._db.execute("UPDATE jobs SET state='abandoned', updated=? WHERE id=?", (now, job_id))
+
+        self._db.commit()
+        return replay, abandoned
+
+    # ==================================================
+    # PUBLIC API (non-blocking)
+    # ==================================================
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    def record(self, job):
+        payload = {k: v for k, v in job.items() if k not in ("id", "attempts")}
+        self._put(("record", job["id"], json.dumps(payload), time.time()))
+
+    def mark_started(self, job_id):
+        self._put(("started", job_id, time.time()))
+
+    def mark_progress(self, job_id, done):
+        self._put(("progress", job_id, int(done), time.time()))
+
+    def mark_finished(self, job_id):
+        self._put(("finished", job_id, time.time()))
+
+    def flush(self, timeout=2.0):
+        """Tunggu sampai semua operasi yang sudah masuk ter-commit."""
+        if not self._running:
+            return False
+        with self._flushed:
+            target = self._seq_put
+            return self._flushed.wait_for(lambda: self._seq_done >= target, timeout)
+
+    def close(self):
+        self.flush()
+        self._running = False
+        self._ops.put(None)
+
+    # ==================================================
+    # INTERNAL
+    # ==================================================
+    def _put(self, op):
+        with self._flushed:
+            self._seq_put += 1
+        self._ops.put(op)
+
+    def _writer(self):
+        last_prune = 0
+        while self._running:
+            op = self._ops.get()
+            if op is None:
+                break
+
+            batch = [op]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    nxt = self._ops.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._running = False
+                    break
+                batch.append(nxt)
+
+            try:
+                self._apply(batch)
+                if time.time() - last_prune > 3600:
+                    self._prune()
+                    last_prune = time.time()
+            except Exception as e:
+                print("JobJournal write error:", e)
+
+            with self._flushed:
+                self._seq_done += len(batch)
+                self._flushed.notify_all()
+
+    def _apply(self, batch):
+        cur = self._db.cursor()
+        for op in batch:
+            kind = op[0]
+            if kind == "record":
+                _, job_id, payload, ts = op
+                cur.execute(
+                    "INSERT OR REPLACE INTO jobs (id, payload, state, attempts, done, created, updated)"
+                    " VALUES (?, ?, 'queued', 0, 0, ?, ?)",
+                    (job_id, payload, ts, ts)
+                )
+            elif kind == "started":
+                _, job_id, ts = op
+                cur.execute(
+                    "UPDATE jobs SET state='started', attempts=attempts+1, updated=? WHERE id=?",
+                    (ts, job_id)
+                )
+            elif kind == "progress":
+                _, job_id, done, ts = op
+                cur.execute("UPDATE jobs SET done=?, updated=? WHERE id=?", (done, ts, job_id))
+            elif kind == "finished":
+                _, job_id, ts = op
+                cur.execute("UPDATE jobs SET state='finished', updated=? WHERE id=?", (ts, job_id))
+        self._db.commit()
+
+    def _prune(self):
+        cutoff = time.time() - self.keep_finished
+        self._db.execute(
+            "DELETE FROM jobs WHERE state IN ('finished', 'abandoned') AND updated < ?",
+            (cutoff,)
+        )
+        self._db.commit()
@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import deque
+
+
+class TokenBucket:
+    def __init__(self, rate, per=60.0, burst=None):
+        self.rate = float(rate)
+        self.per = float(per)
+        self.burst = float(burst if burst is not None else max(1, rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if self.rate <= 0:
+            return
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate / self.per)
+            self.updated = now
+
+    def available(self, now):
+        self._refill(now)
+        return self.tokens >= 1
+
+    def consume(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def wait_time(self, now):
+        """Detik sampai 1 token tersedia."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        if self.rate <= 0:
+            return None
+        return (1 - self.tokens) * self.per / self.rate
+
+
+class JobScheduler:
+    """
+    Pengganti Queue untuk command worker dengan rate limit token bucket.
+
+    keys_fn(job) -> list key bucket, contoh ["platform:SMS", "sim:0"].
+    limits: {key: {"rate": n, "per": detik, "burst": n}}; key "sim:*"
+    berlaku untuk semua key berawalan "sim:" yang tidak diatur eksplisit.
+
+    get() mengembalikan job FIFO pertama yang semua bucket-nya punya token;
+    job yang belum dapat token tetap menunggu (tidak gagal) sementara job
+    lain yang eligible tetap jalan.
+    """
+
+    def __init__(self, keys_fn, limits=None):
+        self.keys_fn = keys_fn
+        self.limits = dict(limits or {})
+        self._buckets = {}
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._unfinished = 0
+        self.delayed = 0
+
+    # ==================================================
+    # QUEUE API
+    # ==================================================
+    def put(self, job, front=False):
+        with self._cond:
+            if front:
+                self._pending.appendleft(job)
+            else:
+                self._pending.append(job)
+            self._unfinished += 1
+            self._cond.notify_all()
+
+    def get(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = None
+
+                for job in self._pending:
+                    buckets = self._job_buckets(job)
+                    if all(b.available(now) for b in buckets):
+                        for b in buckets:
+                            b.consume(now)
+                        self._pending.remove(job)
+                        return job
+
+                    for b in buckets:
+                        w = b.wait_time(now)
+                        if w and (wait is None or w < wait):
+                            wait = w
+
+                if self._pending:
+                    self.delayed += 1
+                self._cond.wait(wait)
+
+    def task_done(self):
+        with self._cond:
+            self._unfinished = max(0, self._unfinished - 1)
+
+    def qsize(self):
+        with self._cond:
+            return len(self._pending)
+
+    # ==================================================
+    # RATE LIMIT
+    # ==================================================
+    def try_acquire(self, job):
+        """Ambil token untuk job tanpa menunggu; False jika belum tersedia."""
+        with self._cond:
+            now = time.monotonic()
+            buckets = self._job_buckets(job)
+            if not all(b.available(now) for b in buckets):
+                return False
+            for b in buckets:
+                b.consume(now)
+            return True
+
+    def snapshot(self):
+        with self._cond:
+            now = time.monotonic()
+            waiting = {}
+            for job in self._pending:
+                for key in self._limited_keys(job):
+                    if not self._bucket(key).available(now):
+                        waiting[key] = waiting.get(key, 0) + 1
+
+            buckets = {}
+            for key, b in self._buckets.items():
+                b._refill(now)
+                buckets[key] = {
+                    "tokens": round(b.tokens, 2),
+                    "rate": b.rate,
+                    "per": b.per,
+                    "burst": b.burst,
+                    "waiting": waiting.get(key, 0)
+                }
+
+            return {
+                "pending": len(self._pending),
+                "delayed": self.delayed,
+                "buckets": buckets
+            }
+
+    def _limit_for(self, key):
+        if key in self.limits:
+            return self.limits[key]
+        prefix = key.split(":", 1)[0]
+        return self.limits.get(f"{prefix}:*")
+
+    def _limited_keys(self, job):
+        try:
+            keys = self.keys_fn(job) or []
+        except Exception:
+            keys = []
+        return [k for k in keys if self._limit_for(k)]
+
+    def _bucket(self, key):
+        b = self._buckets.get(key)
+        if b is None:
+            cfg = self._limit_for(key)
+            b = TokenBucket(cfg.get("rate", 1), cfg.get("per", 60), cfg.get("burst"))
+            self._buckets[key] = b
+        return b
+
+    def _job_buckets(self, job):
+        return [self._bucket(k) for k in self._limited_keys(job)]
@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+
+class Outbox:
+    """
+    Buffer pesan keluar (ack, sms_received, ...) selama WebSocket putus.
+
+    Pesan disimpan di memori; jika lebih dari mem_limit, yang paling lama
+    dipindah ke file jsonl (spill). drain() mengembalikan semua pesan
+    berurutan (disk dulu, lalu memori) dan membuang yang lebih tua dari
+    max_age. Total dibatasi max_messages (yang paling lama dibuang).
+    Setiap pesan diberi msg_id supaya server bisa dedup saat replay.
+    """
+
+    def __init__(self, path, mem_limit=500, max_messages=5000, max_age=86400):
+        self.path = path
+        self.mem_limit = mem_limit
+        self.max_messages = max_messages
+        self.max_age = max_age
+
+        self._mem = deque()
+        self._disk_count = 0
+        self._disk_skip = 0
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+        # sisa dari run sebelumnya (restart / update script)
+        try:
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    self._disk_count = sum(1 for line in f if line.strip())
+        except Exception as e:
+            print("Outbox load error:", e)
+
+    def __len__(self):
+        with self._lock:
+            return self._disk_count - self._disk_skip + len(self._mem)
+
+    @staticmethod
+    def ensure_id(msg):
+        if isinstance(msg, dict) and "msg_id" not in msg:
+            msg["msg_id"] = uuid.uuid4().hex
+        return msg
+
+    def add(self, msg):
+        self.ensure_id(msg)
+        with self._lock:
+            self._mem.append({"ts": time.time(), "msg": msg})
+
+            if len(self._mem) > self.mem_limit:
+                self._spill(len(self._mem) - self.mem_limit)
+
+            # batas total: buang yang paling lama
+            over = self._disk_count - self._disk_skip + len(self._mem) - self.max_messages
+            while over > 0:
+                if self._disk_count - self._disk_skip > 0:
+                    self._disk_skip += 1
+                else:
+                    self._mem.popleft()
+                self.dropped += 1
+                over -= 1
+
+    def drain(self):
+        """Ambil semua pesan (urut lama → baru) dan kosongkan outbox."""
+        with self._lock:
+            entries = []
+            if self._disk_count:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        lines = [line for line in f if line.strip()]
+                    for line in lines[self._disk_skip:]:
+                        try:
+                            entries.append(json.loads(line))
+                        except Exception:
+                            continue
+                    os.remove(self.path)
+                except Exception as e:
+                    print("Outbox read error:", e)
+                self._disk_count = 0
+                self._disk_skip = 0
+
+            entries.extend(self._mem)
+            self._mem.clear()
+
+        cutoff = time.time() - self.max_age
+        fresh = [e["msg"] for e in entries if e.get("ts", 0) >= cutoff]
+        self.dropped += len(entries) - len(fresh)
+        return fresh
+
+    def persist(self):
+        """Tulis semua pesan di memori ke disk (sebelum restart / shutdown)."""
+        with self._lock:
+            if self._mem:
+                self._spill(len(self._mem))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self._disk_count - self._disk_skip + len(self._mem),
+                "on_disk": self._disk_count - self._disk_skip,
+                "dropped": self.dropped
+            }
+
+    def _spill(self, n):
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                for _ in range(n):
+                    f.write(json.dumps(self._mem.popleft()) + "\n")
+                    self._disk_count += 1
+        except Exception as e:
+            print("Outbox spill error:", e)
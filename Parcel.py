@@ -0,0 +1,80 @@
+"""
+Parcel.py - decoder output `service call` (hex dump Parcel).
+
+Contoh output:
+
+    Result: Parcel(
+      0x00000000: 00000000 0000000f 00350033 00380036 '........3.5.6.8.'
+      0x00000010: 00310033 00300030 00300030 00310030 '3.1.0.0.0.0.0.1.'
+      0x00000020: 00390035 00000032                   '5.9.2...        ')
+
+Setiap kolom adalah word 32-bit little-endian. Word pertama = status
+(0 = OK, selain itu kode exception), lalu String16: panjang (word, -1 =
+null) diikuti karakter UTF-16LE, dua karakter per word. Contoh di atas:
+status 0, panjang 15, value "356831000001592" (00350033 → "35").
+"""
+import re
+import struct
+from collections import namedtuple
+
+
+class ParcelResult(namedtuple("ParcelResult", "status value error")):
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.status == 0 and self.error is None
+
+
+_OFFSET = re.compile(r"0x[0-9a-fA-F]+:")
+_QUOTED = re.compile(r"'[^']*'")
+_WORD = re.compile(r"\b[0-9a-fA-F]{8}\b")
+_NULL_LEN = 0xFFFFFFFF
+
+
+def parcel_words(text):
+    """Ambil semua word hex dari hex dump (tanpa offset & kolom ASCII)."""
+    words = []
+    for line in text.splitlines():
+        line = _QUOTED.sub(" ", _OFFSET.sub(" ", line))
+        words.extend(int(w, 16) for w in _WORD.findall(line))
+    return words
+
+
+def read_string16(words, index):
+    """Baca String16 mulai dari words[index]; return None untuk null / data kurang."""
+    if index >= len(words):
+        return None
+    length = words[index]
+    if length == _NULL_LEN:
+        return None
+    raw = b"".join(struct.pack("<I", w) for w in words[index + 1:])
+    if len(raw) < length * 2:
+        return None
+    return raw[:length * 2].decode("utf-16-le", errors="replace")
+
+
+def parse_parcel(text):
+    """
+    Decode output `service call ...` yang mengembalikan String16.
+    - ok: status 0, value = string (None jika null)
+    - exception: status != 0, error = pesan exception jika ada
+    - output tidak dikenal / error binder: status None, error = teks
+    """
+    text = (text or "").strip()
+    if "Parcel(" not in text:
+        return ParcelResult(None, None, text or "empty")
+    if "Error:" in text:
+        return ParcelResult(None, None, text)
+
+    words = parcel_words(text[text.index("Parcel(") + len("Parcel("):])
+    if not words:
+        return ParcelResult(None, None, "no data")
+
+    status = words[0]
+    if status != 0:
+        # exception: int code diikuti String16 pesan
+        code = status - (1 << 32) if status & 0x80000000 else status
+        return ParcelResult(code, None, read_string16(words, 1) or f"exception {code}")
+
+    return ParcelResult(0, read_string16(words, 1), None)
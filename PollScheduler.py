@@ -0,0 +1,78 @@
+import threading
+import time
+
+
+class PollScheduler:
+    """
+    Jadwal poll adaptif (mis. SMS masuk).
+
+    Setiap poll kosong interval dikali backoff sampai max_interval; begitu
+    ada hasil, interval kembali ke min_interval. expect() (setelah kirim
+    SMS / USSD, balasan kemungkinan datang) memicu poll segera dan menahan
+    interval minimum selama expect_window detik. trigger() memicu poll
+    segera (mis. dari watcher logcat).
+
+    Konsumer thread: poll lalu wait(next_delay()). Konsumer asyncio: pasang
+    waker (dipanggil dari thread mana pun saat trigger) dan tunggu sendiri.
+    """
+
+    def __init__(self, min_interval=3, max_interval=60, backoff=1.5, expect_window=120):
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.backoff = backoff
+        self.expect_window = expect_window
+        self.waker = None
+
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._interval = min_interval
+        self._expect_until = 0
+        self.polls = 0
+        self.triggers = 0
+
+    def record(self, found):
+        """Hasil satu poll: found > 0 → interval minimum, 0 → mundur."""
+        with self._lock:
+            self.polls += 1
+            if found:
+                self._interval = self.min_interval
+            else:
+                self._interval = min(self.max_interval, self._interval * self.backoff)
+
+    def next_delay(self):
+        with self._lock:
+            if time.time() < self._expect_until:
+                return self.min_interval
+            return self._interval
+
+    def expect(self, window=None):
+        """Balasan diharapkan: poll sekarang dan rapat selama window detik."""
+        with self._lock:
+            until = time.time() + (self.expect_window if window is None else window)
+            self._expect_until = max(self._expect_until, until)
+            self._interval = self.min_interval
+        self.trigger()
+
+    def trigger(self):
+        self.triggers += 1
+        self._event.set()
+        if self.waker:
+            try:
+                self.waker()
+            except Exception:
+                pass
+
+    def wait(self, timeout):
+        """Tidur sampai timeout atau trigger(); return True jika di-trigger."""
+        fired = self._event.wait(timeout)
+        self._event.clear()
+        return fired
+
+    def stats(self):
+        with self._lock:
+            return {
+                "interval": round(self._interval, 1),
+                "expecting": max(0, round(self._expect_until - time.time())),
+                "polls": self.polls,
+                "triggers": self.triggers
+            }
@@ -0,0 +1,151 @@
+import threading
+import time
+
+
+class ProfileService:
+    """
+    Profil device yang di-refresh di background per tier, supaya open
+    handshake dan heartbeat cukup membaca snapshot tanpa adb.
+
+    tiers: {"static": fn, "sim": fn, "fast": fn}, tiap fn() → dict field,
+    atau None jika hasilnya tidak lengkap (tier dicoba lagi putaran berikutnya).
+    - static: sekali saat start (props build, serial, abi, root)
+    - sim: saat sim_key_fn() berubah (dicek tiap sim_check_interval) atau
+      paling lama sim_max_age detik (IMEI, nomor, ICCID, sim state)
+    - fast: tiap fast_interval (signal, network type, operator, ip)
+    assemble_fn(parts) menyusun dict akhir dari hasil semua tier.
+    on_change(tier) dipanggil dari thread service saat hasil tier berubah.
+    """
+
+    TIERS = ("static", "sim", "fast")
+
+    def __init__(self, tiers, assemble_fn, sim_key_fn=None, fast_interval=10,
+                 sim_check_interval=15, sim_max_age=3600, on_change=None):
+        self.tiers = tiers
+        self.assemble_fn = assemble_fn
+        self.sim_key_fn = sim_key_fn
+        self.fast_interval = fast_interval
+        self.sim_check_interval = sim_check_interval
+        self.sim_max_age = sim_max_age
+        self.on_change = on_change
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._ready = threading.Event()
+        self._parts = {}
+        self._updated = {}
+        self._snapshot = {}
+        self._sim_key = None
+        self._forced = set(self.TIERS)
+        self._running = False
+        self._thread = None
+
+    # ==================================================
+    # CONSUMER API
+    # ==================================================
+    def snapshot(self):
+        """Profil lengkap terakhir ({} sebelum refresh pertama selesai)."""
+        with self._lock:
+            return self._snapshot
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def refresh(self, tier=None):
+        """Minta refresh tier tertentu (atau semua) secepatnya."""
+        with self._lock:
+            self._forced.update([tier] if tier else self.TIERS)
+        self._wake.set()
+
+    def seed(self, parts):
+        """Isi tier dari hasil yang sudah dikumpulkan (mis. startup) tanpa adb."""
+        now = time.time()
+        with self._lock:
+            for tier in self.TIERS:
+                if tier in parts:
+                    self._parts[tier] = parts[tier]
+                    self._updated[tier] = now
+                    self._forced.discard(tier)
+            if len(self._parts) == len(self.TIERS):
+                self._snapshot = self.assemble_fn(dict(self._parts))
+                self._ready.set()
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {tier: round(now - ts, 1) for tier, ts in self._updated.items()}
+
+    # ==================================================
+    # SERVICE
+    # ==================================================
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+    def _run(self):
+        next_sim_check = 0
+        while self._running:
+            now = time.time()
+            with self._lock:
+                due = set(self._forced)
+                self._forced.clear()
+            if "fast" not in due and now - self._updated.get("fast", 0) >= self.fast_interval:
+                due.add("fast")
+            if "sim" not in due and now - self._updated.get("sim", 0) >= self.sim_max_age:
+                due.add("sim")
+            if "sim" not in due and self.sim_key_fn and now >= next_sim_check:
+                next_sim_check = now + self.sim_check_interval
+                try:
+                    key = self.sim_key_fn()
+                    if self._sim_key is None and "sim" in self._parts:
+                        # tier sim dari seed(): jadikan key sekarang sebagai acuan
+                        self._sim_key = key
+                    elif key != self._sim_key:
+                        due.add("sim")
+                except Exception as e:
+                    print("ProfileService sim check error:", e)
+
+            changed = [tier for tier in self.TIERS if tier in due and self._collect(tier)]
+            if not self._ready.is_set() and len(self._parts) == len(self.TIERS):
+                self._ready.set()
+
+            if self.on_change:
+                for tier in changed:
+                    try:
+                        self.on_change(tier)
+                    except Exception as e:
+                        print("ProfileService on_change error:", e)
+
+            self._wake.wait(min(self.fast_interval, self.sim_check_interval))
+            self._wake.clear()
+
+    def _collect(self, tier):
+        """Jalankan collector tier; return True jika hasilnya berubah."""
+        try:
+            if tier == "sim" and self.sim_key_fn:
+                self._sim_key = self.sim_key_fn()
+            part = self.tiers[tier]()
+        except Exception as e:
+            print(f"ProfileService {tier} error:", e)
+            return False
+        if part is None:
+            with self._lock:
+                self._forced.add(tier)
+            return False
+
+        with self._lock:
+            self._updated[tier] = time.time()
+            if self._parts.get(tier) == part:
+                return False
+            self._parts[tier] = part
+            if len(self._parts) == len(self.TIERS):
+                # snapshot baru (copy-on-write), pembaca lama tetap konsisten
+                self._snapshot = self.assemble_fn(dict(self._parts))
+        return True
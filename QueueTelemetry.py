@@ -0,0 +1,81 @@
+import math
+import threading
+import time
+from array import array
+
+
+class RollingWindow:
+    """Ring buffer ukuran tetap (array 'd') untuk persentil latency terbaru."""
+
+    def __init__(self, size=512):
+        self.size = size
+        self._buf = array('d', [0.0]) * size
+        self._pos = 0
+        self._count = 0
+        self.total = 0
+
+    def add(self, value):
+        self._buf[self._pos] = value
+        self._pos = (self._pos + 1) % self.size
+        if self._count < self.size:
+            self._count += 1
+        self.total += 1
+
+    def percentiles(self, ps=(50, 90, 99)):
+        if not self._count:
+            return {}
+        values = sorted(self._buf[:self._count])
+        out = {}
+        for p in ps:
+            idx = min(self._count - 1, max(0, math.ceil(p / 100.0 * self._count) - 1))
+            out[f"p{p}"] = round(values[idx], 3)
+        out["max"] = round(values[-1], 3)
+        return out
+
+
+class QueueTelemetry:
+    """
+    Statistik antrian command per platform:
+    - wait: enqueue (_on_message) → worker mulai item
+    - service: worker mulai item → ack terkirim
+    """
+
+    def __init__(self, window=512):
+        self.window = window
+        self._lock = threading.Lock()
+        self._wait = {}
+        self._service = {}
+        self.enqueued = 0
+        self.max_depth = 0
+        self.started_at = time.time()
+
+    def job_enqueued(self, depth):
+        with self._lock:
+            self.enqueued += 1
+            if depth > self.max_depth:
+                self.max_depth = depth
+
+    def record(self, platform, wait, service):
+        with self._lock:
+            if platform not in self._wait:
+                self._wait[platform] = RollingWindow(self.window)
+                self._service[platform] = RollingWindow(self.window)
+            self._wait[platform].add(max(0.0, wait))
+            self._service[platform].add(max(0.0, service))
+
+    def snapshot(self, depth=None):
+        with self._lock:
+            platforms = {}
+            for platform, w in self._wait.items():
+                platforms[platform] = {
+                    "count": w.total,
+                    "wait": w.percentiles(),
+                    "service": self._service[platform].percentiles()
+                }
+            return {
+                "depth": depth,
+                "max_depth": self.max_depth,
+                "enqueued": self.enqueued,
+                "uptime": int(time.time() - self.started_at),
+                "platforms": platforms
+            }
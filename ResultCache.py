@@ -0,0 +1,75 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Cache LRU untuk hasil command read-only (ADB read, screenshot).
+    Setiap entry punya TTL sendiri; ukuran dibatasi jumlah entry dan total byte.
+    """
+
+    def __init__(self, max_entries=64, max_bytes=8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()   # key -> (expires, stored_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, stored_at, size, value = entry
+            if time.monotonic() >= expires:
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value, time.monotonic() - stored_at
+
+    def put(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        try:
+            size = len(json.dumps(value))
+        except Exception:
+            return
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            now = time.monotonic()
+            self._data[key] = (now + ttl, now, size, value)
+            self._bytes += size
+
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def _drop(self, key):
+        entry = self._data.pop(key, None)
+        if entry:
+            self._bytes -= entry[2]
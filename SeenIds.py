@@ -0,0 +1,42 @@
+import threading
+from collections import OrderedDict
+
+
+class SeenIds:
+    """
+    Set id yang sudah diproses, terurut sesuai waktu masuk dan dibatasi
+    maxlen. Id yang paling lama dibuang lebih dulu (O(1), tanpa membangun
+    ulang), id yang dilihat lagi dipindah ke posisi terbaru.
+    to_list() / items awal dipakai untuk menyimpan & memuat dari disk.
+    """
+
+    def __init__(self, maxlen=2000, items=()):
+        self.maxlen = maxlen
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+        for key in items:
+            self.add(key)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._ids
+
+    def __len__(self):
+        with self._lock:
+            return len(self._ids)
+
+    def add(self, key):
+        """Tandai key sudah dilihat; return True jika sebelumnya belum ada."""
+        with self._lock:
+            if key in self._ids:
+                self._ids.move_to_end(key)
+                return False
+            self._ids[key] = None
+            while len(self._ids) > self.maxlen:
+                self._ids.popitem(last=False)
+            return True
+
+    def to_list(self):
+        """Id urut dari yang paling lama."""
+        with self._lock:
+            return list(self._ids)
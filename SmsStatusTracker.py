@@ -0,0 +1,180 @@
+import re
+import threading
+import time
+
+
+class SmsStatusTracker:
+    """
+    Status kirim SMS dari tabel content://sms.
+
+    track() mencatat SMS keluar (request_id, index, nomor, teks per kiriman).
+    update(row) menerima baris non-inbox dari query inkremental yang sama
+    dengan poll SMS masuk (cursor _id bersama) dan mencocokkannya dengan
+    nomor (9 digit terakhir) + body. Setiap perubahan status dikirim lewat
+    emit_fn sebagai event sms_status:
+
+        queued → sent → delivered / undelivered, atau failed
+
+    Baris yang belum final (outbox/queued, atau sent menunggu laporan
+    terkirim) dikembalikan watch_ids() supaya ikut di-query ulang. Yang
+    tidak final dalam timeout detik dilaporkan "unconfirmed".
+    """
+
+    # kolom type di content://sms
+    TYPES = {"2": "sent", "4": "queued", "5": "failed", "6": "queued"}
+    # kolom status (laporan terkirim): -1 tidak diminta, 0 terkirim, 32 pending, 64 gagal
+    FINAL = ("failed", "delivered", "undelivered")
+
+    def __init__(self, emit_fn, timeout=300):
+        self.emit_fn = emit_fn
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries = []
+        self._row_owner = {}
+        self.emitted = 0
+
+    @staticmethod
+    def _tail(number):
+        return re.sub(r"\D", "", str(number or ""))[-9:]
+
+    def track(self, request_id, index, number, bodies, message=None):
+        """
+        Catat SMS keluar sebelum dikirim (barisnya bisa muncul sebelum kirim
+        selesai). bodies = teks tiap kiriman (lebih dari satu jika dipecah),
+        message = posisi dalam item bulk.
+        """
+        with self._lock:
+            self._entries.append({
+                "request_id": request_id,
+                "index": index,
+                "message": message,
+                "to": number,
+                "tail": self._tail(number),
+                "bodies": list(bodies),
+                "rows": {},
+                "status": None,
+                "ts": time.time()
+            })
+
+    def forget(self, request_id, index, message=None):
+        """Batalkan tracking (mis. termux-sms-send gagal)."""
+        with self._lock:
+            for entry in [e for e in self._entries if (e["request_id"], e["index"], e["message"]) == (request_id, index, message)]:
+                self._drop(entry)
+
+    def active(self):
+        with self._lock:
+            return bool(self._entries)
+
+    def watch_ids(self):
+        """_id baris yang statusnya masih bisa berubah."""
+        with self._lock:
+            return sorted(
+                row_id for entry in self._entries
+                for row_id, state in entry["rows"].items()
+                if state in ("queued", "sent")
+            )
+
+    def update(self, row):
+        state = self.TYPES.get(row.get("type"))
+        if not state:
+            return
+        if state == "sent":
+            state = {"0": "delivered", "64": "undelivered"}.get(row.get("status"), "sent")
+        row_id = int(row["_id"])
+
+        events = []
+        with self._lock:
+            entry = self._row_owner.get(row_id) or self._match(row)
+            if entry is None:
+                return
+            self._row_owner[row_id] = entry
+            entry["rows"][row_id] = state
+            status = self._entry_status(entry)
+            if status != entry["status"]:
+                entry["status"] = status
+                events.append(self._event(entry))
+            if self._is_final(entry, row.get("status")):
+                self._drop(entry)
+
+        for event in events:
+            self._emit(event)
+
+    def expire(self, force=False):
+        """Laporkan & lupakan entri yang tidak final dalam timeout (force: semua)."""
+        now = time.time()
+        events = []
+        with self._lock:
+            for entry in [e for e in self._entries if force or now - e["ts"] > self.timeout]:
+                # sent yang menunggu laporan terkirim sudah dilaporkan
+                if entry["status"] != "sent":
+                    entry["status"] = "unconfirmed"
+                    events.append(self._event(entry))
+                self._drop(entry)
+        for event in events:
+            self._emit(event)
+
+    def stats(self):
+        with self._lock:
+            return {"pending": len(self._entries), "emitted": self.emitted}
+
+    # ==================================================
+    # INTERNAL (dipanggil dengan _lock)
+    # ==================================================
+    def _match(self, row):
+        tail = self._tail(row.get("address"))
+        body = row.get("body") or ""
+        try:
+            row_ts = int(row.get("date") or 0) / 1000
+        except ValueError:
+            row_ts = 0
+        for entry in self._entries:
+            if entry["tail"] != tail or row_ts < entry["ts"] - 30:
+                continue
+            if body in entry["bodies"] and len(entry["rows"]) < len(entry["bodies"]):
+                return entry
+        return None
+
+    def _entry_status(self, entry):
+        states = list(entry["rows"].values())
+        if "failed" in states:
+            return "failed"
+        if "undelivered" in states:
+            return "undelivered"
+        if len(states) < len(entry["bodies"]) or "queued" in states:
+            return "queued"
+        if all(s == "delivered" for s in states):
+            return "delivered"
+        return "sent"
+
+    def _is_final(self, entry, report):
+        if entry["status"] in self.FINAL:
+            return True
+        # sent tanpa permintaan laporan terkirim tidak akan berubah lagi
+        return entry["status"] == "sent" and report in (None, "-1")
+
+    def _drop(self, entry):
+        self._entries = [e for e in self._entries if e is not entry]
+        for row_id in entry["rows"]:
+            self._row_owner.pop(row_id, None)
+
+    def _event(self, entry):
+        event = {
+            "type": "sms_status",
+            "request_id": entry["request_id"],
+            "index": entry["index"],
+            "to": entry["to"],
+            "status": entry["status"],
+            "sms_ids": sorted(entry["rows"]),
+            "elapsed": round(time.time() - entry["ts"], 1)
+        }
+        if entry["message"] is not None:
+            event["message"] = entry["message"]
+        return event
+
+    def _emit(self, event):
+        self.emitted += 1
+        try:
+            self.emit_fn(event)
+        except Exception as e:
+            print("SmsStatusTracker emit error:", e)
@@ -0,0 +1,122 @@
+import difflib
+import json
+import os
+import re
+import threading
+import time
+
+
+def chain_ussd_code(code, choices):
+    """*123# + [2, 2] → *123*2*2# (None jika kode tidak bisa dirangkai)."""
+    code = (code or "").strip()
+    if not choices or not code.startswith("*") or not code.endswith("#"):
+        return None
+    return code[:-1] + "".join(f"*{c}" for c in choices) + "#"
+
+
+def response_signature(message):
+    """Bentuk response tanpa angka (saldo, tanggal) untuk dibandingkan."""
+    text = re.sub(r"\d+", "#", (message or "").lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class UssdPathCache:
+    """
+    Cache jalur menu USSD per (operator, sim, code, keywords).
+
+    Entri: choices (nomor menu hasil sesi interaktif), signature response
+    akhir, apakah berakhir di menu, status kode berantai (None = belum
+    dicoba, True = didukung, False = operator tidak mendukung) dan hits.
+    Disimpan ke file JSON kecil; entri paling lama dipakai dibuang jika
+    lebih dari max_entries.
+    """
+
+    def __init__(self, path, max_entries=500, match_ratio=0.6):
+        self.path = path
+        self.max_entries = max_entries
+        self.match_ratio = match_ratio
+        self._lock = threading.Lock()
+        self._entries = {}
+        try:
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+        except Exception as e:
+            print("UssdPathCache load error:", e)
+
+    @staticmethod
+    def key(operator, sim, code, keywords):
+        kws = "/".join(str(k).strip().lower() for k in keywords)
+        return f"{(operator or '-').strip().lower()}|{sim}|{(code or '').strip()}|{kws}"
+
+    def get(self, key):
+        """Entri dengan jalur yang bisa dipakai, atau None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry) if entry and entry.get("choices") else None
+
+    def matches(self, entry, result):
+        """Response (mis. dari kode berantai) sama bentuknya dengan jalur tersimpan?"""
+        if bool(result.get("menu")) != bool(entry.get("menu")):
+            return False
+        ratio = difflib.SequenceMatcher(
+            None, entry.get("signature") or "", response_signature(result.get("final"))
+        ).ratio()
+        return ratio >= self.match_ratio
+
+    def record(self, key, result):
+        """Simpan jalur dari sesi yang berhasil; status chain direset jika jalur berubah."""
+        with self._lock:
+            old = self._entries.get(key) or {}
+            choices = list(result.get("choices") or [])
+            self._entries[key] = {
+                "choices": choices,
+                "signature": response_signature(result.get("final")),
+                "menu": bool(result.get("menu")),
+                "chain": old.get("chain") if old.get("choices") in (None, choices) else None,
+                "hits": old.get("hits", 0),
+                "ts": time.time()
+            }
+            self._trim()
+            self._save()
+
+    def hit(self, key, chain=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return
+            entry["hits"] = entry.get("hits", 0) + 1
+            entry["ts"] = time.time()
+            if chain is not None:
+                entry["chain"] = chain
+            self._save()
+
+    def invalidate(self, key, chain=None):
+        """Buang jalur; chain=False diingat supaya kode berantai tidak dicoba lagi."""
+        with self._lock:
+            if chain is False:
+                self._entries[key] = {"choices": None, "chain": False, "ts": time.time()}
+            else:
+                self._entries.pop(key, None)
+            self._save()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "paths": sum(1 for e in self._entries.values() if e.get("choices")),
+                "chain": sum(1 for e in self._entries.values() if e.get("chain")),
+                "hits": sum(e.get("hits", 0) for e in self._entries.values())
+            }
+
+    def _trim(self):
+        over = len(self._entries) - self.max_entries
+        if over > 0:
+            for key in sorted(self._entries, key=lambda k: self._entries[k].get("ts", 0))[:over]:
+                del self._entries[key]
+
+    def _save(self):
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+        except Exception as e:
+            print("UssdPathCache save error:", e)
@@ -0,0 +1,273 @@
+import re
+import shlex
+import time
+import urllib.parse
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+
+MESSAGE_ID = "android:id/message"
+INPUT_ID = "com.android.phone:id/input_field"
+SEND_ID = "android:id/button1"
+CANCEL_ID = "android:id/button2"
+SIM_TITLE_ID = "com.android.dialer:id/alertTitle"
+SIM_LIST_ID = "com.android.dialer:id/select_dialog_listview"
+
+
+def _center(bounds):
+    nums = list(map(int, re.findall(r"\d+", bounds or "")))
+    if len(nums) != 4:
+        return None
+    x1, y1, x2, y2 = nums
+    return (x1 + x2) // 2, (y1 + y2) // 2
+
+
+def pick_menu_by_keyword(message, keyword):
+    lines = message.splitlines()
+
+    for line in lines:
+        m = re.match(r"^\s*(\d+)[\.\)]\s*(.+)", line)
+        if not m:
+            continue
+
+        number = m.group(1)
+        text = m.group(2).lower()
+
+        if keyword.lower() in text:
+            return number
+
+    return None
+
+
+class UssdScreen(namedtuple("UssdScreen", "message loading input_at input_text send_at cancel_at sim_rows")):
+    """Hasil parse satu uiautomator dump dialog USSD (titik tap sudah dihitung)."""
+    __slots__ = ()
+
+    @property
+    def has_input(self):
+        return self.input_at is not None
+
+    @property
+    def key(self):
+        # pembeda "response baru" untuk change-driven wait
+        return (self.message, self.has_input)
+
+
+def parse_ussd_screen(xml, loading_keywords=()):
+    message, loading = None, False
+    input_at, input_text, send_at, cancel_at = None, "", None, None
+    sim_dialog, sim_rows = False, []
+
+    if xml and "<?xml" in xml:
+        root = ET.fromstring(xml[xml.index("<?xml"):])
+        for node in root.iter("node"):
+            rid = node.attrib.get("resource-id")
+            if rid == MESSAGE_ID and message is None:
+                txt = (node.attrib.get("text") or "").strip()
+                if txt and any(k in txt.lower() for k in loading_keywords):
+                    loading = True
+                elif txt:
+                    message = txt
+            elif rid == INPUT_ID:
+                input_at = _center(node.attrib.get("bounds"))
+                input_text = node.attrib.get("text") or ""
+            elif rid == SEND_ID:
+                send_at = _center(node.attrib.get("bounds"))
+            elif rid == CANCEL_ID:
+                cancel_at = _center(node.attrib.get("bounds"))
+            elif rid == SIM_TITLE_ID and "sim" in (node.attrib.get("text") or "").lower():
+                sim_dialog = True
+            elif rid == SIM_LIST_ID:
+                sim_rows = [_center(child.attrib.get("bounds")) for child in node if child.attrib.get("bounds")]
+
+    return UssdScreen(message, loading, input_at, input_text, send_at, cancel_at,
+                      sim_rows if sim_dialog else [])
+
+
+class UssdSession:
+    """
+    Satu sesi USSD interaktif sebagai state machine:
+
+        DIAL → WAIT → (ERROR | FINAL | MENU → REPLY → WAIT ...)
+
+    Setiap state memakai satu snapshot (dump + cat dalam satu shell, parse
+    sekali); tap & bounds diambil dari snapshot itu, tanpa dump tambahan.
+    REPLY mengirim tap input, clear, teks dan tombol kirim dalam satu
+    shell. WAIT menunggu sampai layar berubah (pesan baru, atau lewat
+    loading) dengan interval poll yang membesar, bukan sleep tetap.
+    """
+
+    def __init__(self, adb, loading_keywords=(), error_keywords=(), dump_path="/sdcard/ussd.xml",
+                 poll_min=0.25, poll_max=1.0, retry_after=3.0, max_steps=10):
+        self.adb = adb
+        self.loading_keywords = loading_keywords
+        self.error_keywords = error_keywords
+        self.dump_path = dump_path
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.retry_after = retry_after
+        self.max_steps = max_steps
+        self.shells = 0
+        self.dumps = 0
+
+    # ==================================================
+    # ADB
+    # ==================================================
+    def _shell(self, cmd):
+        self.shells += 1
+        return self.adb.shell(cmd) or ""
+
+    def snapshot(self):
+        self.dumps += 1
+        xml = self._shell(
+            f"rm -f {self.dump_path}; uiautomator dump {self.dump_path} >/dev/null 2>&1; cat {self.dump_path}"
+        )
+        try:
+            return parse_ussd_screen(xml, self.loading_keywords)
+        except ET.ParseError:
+            return parse_ussd_screen("", self.loading_keywords)
+
+    def dial(self, code):
+        enc = urllib.parse.quote(code, safe='')
+        self._shell(f"am start -a android.intent.action.CALL -d tel:{enc}")
+
+    def reply(self, screen, text):
+        """Tap input, hapus isi lama, ketik, kirim — satu round trip."""
+        cmds = [f"input tap {screen.input_at[0]} {screen.input_at[1]}"]
+        if screen.input_text:
+            cmds.append("input keyevent 123 " + " ".join(["67"] * len(screen.input_text)))
+        cmds.append("input text " + shlex.quote(str(text).replace(" ", "%s")))
+        if screen.send_at:
+            cmds.append(f"input tap {screen.send_at[0]} {screen.send_at[1]}")
+        else:
+            cmds.append("input keyevent 66")
+        self._shell("; ".join(cmds))
+
+    def back(self):
+        self._shell("input keyevent 4")
+
+    def close(self, screen):
+        if screen.cancel_at:
+            self._shell(f"input tap {screen.cancel_at[0]} {screen.cancel_at[1]}")
+        else:
+            print("[USSD] tombol CANCEL tidak ketemu, fallback BACK")
+            self.back()
+
+    # ==================================================
+    # STATE MACHINE
+    # ==================================================
+    def wait_response(self, previous=None, timeout=20, sim=None, retry=None):
+        """
+        Snapshot berikutnya yang berisi response baru (bukan loading, beda
+        dari previous kecuali sempat lewat loading / dialog hilang).
+        Pemilih SIM di-tap dari snapshot yang sama. retry(screen) dipanggil
+        sekali jika layar belum berubah setelah retry_after detik.
+        """
+        start = time.time()
+        delay = self.poll_min
+        changed = previous is None
+        while time.time() - start < timeout:
+            screen = self.snapshot()
+            if screen.sim_rows:
+                if sim is not None and sim < len(screen.sim_rows) and screen.sim_rows[sim]:
+                    x, y = screen.sim_rows[sim]
+                    self._shell(f"input tap {x} {y}")
+                    delay = self.poll_min
+                    continue
+            elif screen.message and not screen.loading:
+                if changed or screen.key != previous.key:
+                    return screen
+            else:
+                changed = True
+
+            if retry and not changed and screen.has_input and time.time() - start > self.retry_after:
+                print("[USSD] response belum berubah, kirim ulang input")
+                retry(screen)
+                retry = None
+            time.sleep(delay)
+            delay = min(delay * 1.5, self.poll_max)
+        return None
+
+    def run(self, code, sim=0, keywords=None, timeout=20, choices=None):
+        """
+        Jalankan sesi; menu dipilih per keyword. choices (jalur tersimpan)
+        dipakai langsung per step selama nomornya ada di menu; jika tidak,
+        step itu kembali ke keyword dan result berisi replay_mismatch.
+        """
+        replay = list(choices or [])
+        result = {
+            "ok": False,
+            "history": [],
+            "final": None,
+            "error": None
+        }
+        started = time.time()
+
+        def done(**fields):
+            fields["stats"] = {
+                "steps": len(result["history"]),
+                "dumps": self.dumps,
+                "shells": self.shells,
+                "elapsed": round(time.time() - started, 2)
+            }
+            return {**result, **fields}
+
+        try:
+            if not code:
+                return done(error="USSD code kosong")
+
+            keywords = keywords or []
+            choices = []
+            mismatch = False
+            sim = int(sim) if sim is not None else None
+
+            self.dial(code)
+            screen = self.wait_response(None, timeout, sim=sim)
+
+            for step in range(self.max_steps):
+                if screen is None:
+                    return done(error="tidak ada response ussd")
+
+                message = screen.message
+                result["history"].append(message)
+
+                if any(k in message.lower() for k in self.error_keywords):
+                    self.back()
+                    return done(error=message)
+
+                # response akhir (tanpa input)
+                if not screen.has_input:
+                    self.back()
+                    return done(ok=True, final=message, choices=choices, replay_mismatch=mismatch)
+
+                # keyword habis → tutup dialog, selesai
+                if step >= len(keywords):
+                    print("[USSD AUTO] step selesai, return hasil")
+                    self.close(screen)
+                    return done(ok=True, final=message, choices=choices, menu=True, replay_mismatch=mismatch)
+
+                kw = keywords[step]
+                choice = replay[step] if step < len(replay) else None
+                if choice and not re.search(rf"(?m)^\s*{re.escape(choice)}[\.\)]", message):
+                    print(f"[USSD AUTO] pilihan tersimpan {choice} tidak ada di menu")
+                    choice, mismatch = None, True
+                if not choice:
+                    choice = pick_menu_by_keyword(message, kw)
+                    print(f"[USSD AUTO] keyword: {kw} → choice: {choice}")
+
+                if not choice:
+                    print("[USSD AUTO] keyword tidak ditemukan, stop")
+                    self.back()
+                    return done(error=f"keyword '{kw}' tidak ditemukan", last_message=message)
+
+                choices.append(choice)
+                self.reply(screen, choice)
+                previous = screen
+                screen = self.wait_response(
+                    previous, timeout, retry=lambda current: self.reply(current, choice)
+                )
+
+            return done(error="max step reached")
+
+        except Exception as e:
+            return done(error=str(e))
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+WSCodec.py - framing biner untuk WebSocket bridgeservice.
+
+Frame biner = header kecil + payload mentah (tanpa base64/JSON):
+
+    magic   2s  b"BS"
+    version B   FRAME_VERSION
+    type    B   FRAME_AUDIO / FRAME_SCREENSHOT
+    seq     I   nomor urut per type
+    format  B   FORMAT_*
+    chans   B   jumlah channel audio (0 jika bukan audio)
+    rate    I   sample rate audio (0 jika bukan audio)
+    rid_len B   panjang request_id (utf-8, maks 255)
+    request_id  rid_len byte
+    payload     sisa frame
+
+Mode ini hanya dipakai jika server membalas capabilities.binary;
+kalau tidak, pengirim tetap memakai JSON + base64.
+
+Kompresi (capabilities.compress = "zlib" / "zstd"): pesan JSON di atas
+threshold dikirim terkompresi, sebagai frame biner FRAME_JSON (format =
+FORMAT_ZLIB / FORMAT_ZSTD) jika binary aktif, atau sebagai envelope
+{"type": "compressed", "enc": ..., "data": base64} jika tidak.
+
+JSON codec: json_dumps() menghasilkan bytes UTF-8 (siap kirim sebagai
+frame teks) memakai orjson / ujson jika terpasang, fallback ke stdlib.
+Pilih manual lewat env JSON_CODEC=orjson|ujson|stdlib. Frame biner
+dibedakan dari teks lewat tipe BinaryFrame.
+
+Jalankan `python WSCodec.py serve [port]` untuk server uji lokal yang
+mengumumkan capability binary/compress dan mencetak frame yang diterima,
+atau `python WSCodec.py bench [n]` untuk membandingkan backend JSON.
+"""
+import base64
+import json
+import os
+import struct
+import threading
+import zlib
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except Exception:
+    ZSTD_AVAILABLE = False
+
+ORJSON_AVAILABLE = False
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except Exception:
+    ORJSON_AVAILABLE = False
+
+UJSON_AVAILABLE = False
+try:
+    import ujson
+    UJSON_AVAILABLE = True
+except Exception:
+    UJSON_AVAILABLE = False
+
+FRAME_MAGIC = b"BS"
+FRAME_VERSION = 1
+
+FRAME_AUDIO = 1
+FRAME_SCREENSHOT = 2
+FRAME_JSON = 3
+
+FORMAT_RAW = 0
+FORMAT_PCM16 = 1
+FORMAT_AMR_NB = 2
+FORMAT_PNG = 3
+FORMAT_ZLIB = 4
+FORMAT_ZSTD = 5
+
+FORMAT_CODES = {
+    "raw": FORMAT_RAW, "pcm16": FORMAT_PCM16, "amr_nb": FORMAT_AMR_NB,
+    "png": FORMAT_PNG, "zlib": FORMAT_ZLIB, "zstd": FORMAT_ZSTD
+}
+FORMAT_NAMES = {v: k for k, v in FORMAT_CODES.items()}
+TYPE_NAMES = {FRAME_AUDIO: "audio_chunk", FRAME_SCREENSHOT: "screenshot", FRAME_JSON: "json"}
+
+_HEADER = struct.Struct("!2sBBIBBIB")
+
+
+class BinaryFrame(bytes):
+    """bytes yang harus dikirim sebagai frame biner (bytes biasa = teks UTF-8)."""
+
+
+# ==================================================
+# JSON CODEC
+# ==================================================
+def _stdlib_dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _ujson_dumps(obj):
+    return ujson.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def _orjson_dumps(obj):
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+JSON_BACKENDS = {"stdlib": (_stdlib_dumps, json.loads)}
+JSON_DECODE_ERRORS = (json.JSONDecodeError,)
+if UJSON_AVAILABLE:
+    JSON_BACKENDS["ujson"] = (_ujson_dumps, ujson.loads)
+    JSON_DECODE_ERRORS += (getattr(ujson, "JSONDecodeError", ValueError),)
+if ORJSON_AVAILABLE:
+    JSON_BACKENDS["orjson"] = (_orjson_dumps, orjson.loads)
+    JSON_DECODE_ERRORS += (orjson.JSONDecodeError,)
+
+JSON_BACKEND = os.environ.get("JSON_CODEC", "").lower()
+if JSON_BACKEND not in JSON_BACKENDS:
+    JSON_BACKEND = "orjson" if ORJSON_AVAILABLE else "ujson" if UJSON_AVAILABLE else "stdlib"
+_dumps, _loads = JSON_BACKENDS[JSON_BACKEND]
+
+
+def json_dumps(obj):
+    """Encode ke bytes UTF-8; tipe yang tidak didukung backend cepat → stdlib."""
+    try:
+        return _dumps(obj)
+    except (TypeError, OverflowError):
+        return json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def json_loads(data):
+    """Decode str / bytes JSON."""
+    return _loads(data)
+
+
+# ==================================================
+# BINARY FRAME
+# ==================================================
+def encode_frame(ftype, payload, seq=0, fmt=FORMAT_RAW, rate=0, channels=0, request_id=None):
+    rid = (request_id or "").encode("utf-8")[:255]
+    if isinstance(fmt, str):
+        fmt = FORMAT_CODES.get(fmt, FORMAT_RAW)
+    header = _HEADER.pack(
+        FRAME_MAGIC, FRAME_VERSION, ftype, seq & 0xFFFFFFFF,
+        fmt, channels, rate, len(rid)
+    )
+    return BinaryFrame(header + rid + bytes(payload))
+
+
+def decode_frame(data):
+    if len(data) < _HEADER.size:
+        raise ValueError("frame terlalu pendek")
+    magic, version, ftype, seq, fmt, channels, rate, rid_len = _HEADER.unpack_from(data)
+    if magic != FRAME_MAGIC:
+        raise ValueError("magic frame tidak dikenal")
+    start = _HEADER.size
+    rid = data[start:start + rid_len].decode("utf-8", errors="replace")
+    return {
+        "version": version,
+        "type": TYPE_NAMES.get(ftype, ftype),
+        "seq": seq,
+        "format": FORMAT_NAMES.get(fmt, fmt),
+        "channels": channels,
+        "rate": rate,
+        "request_id": rid or None,
+        "payload": data[start + rid_len:]
+    }
+
+
+def available_compressors():
+    return ["zstd", "zlib"] if ZSTD_AVAILABLE else ["zlib"]
+
+
+def compress_bytes(data, enc="zlib", level=6):
+    if enc == "zstd" and ZSTD_AVAILABLE:
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return zlib.compress(data, level)
+
+
+def decompress_bytes(data, enc="zlib"):
+    if enc == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class PayloadCompressor:
+    """
+    Kompres payload JSON besar (ack dumpsys, heartbeat device_info, ...).
+    Hanya dipakai jika hasilnya lebih kecil; statistik ukuran/rasio dicatat.
+    """
+
+    def __init__(self, enc="zlib", threshold=1024, binary=False, level=6):
+        self.enc = enc if enc in available_compressors() else "zlib"
+        self.threshold = threshold
+        self.binary = binary
+        self.level = level
+        self._lock = threading.Lock()
+        self.count = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def maybe_compress(self, payload):
+        """
+        payload: JSON (str / bytes UTF-8). Return payload asli, envelope
+        (bytes teks) atau BinaryFrame.
+        """
+        if isinstance(payload, BinaryFrame) or len(payload) < self.threshold:
+            return payload
+
+        raw = payload.encode("utf-8") if isinstance(payload, str) else bytes(payload)
+        packed = compress_bytes(raw, self.enc, self.level)
+
+        if self.binary:
+            out = encode_frame(FRAME_JSON, packed, fmt=self.enc)
+        else:
+            out = b'{"type":"compressed","enc":"%s","data":"%s"}' % (
+                self.enc.encode("ascii"), base64.b64encode(packed)
+            )
+
+        with self._lock:
+            if len(out) >= len(raw):
+                self.skipped += 1
+                return payload
+            self.count += 1
+            self.bytes_in += len(raw)
+            self.bytes_out += len(out)
+        return out
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enc": self.enc,
+                "mode": "binary" if self.binary else "envelope",
+                "count": self.count,
+                "skipped": self.skipped,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None
+            }
+
+
+def decode_json_message(message):
+    """Balikkan pesan teks/biner (termasuk envelope terkompresi) ke string JSON."""
+    if isinstance(message, (bytes, bytearray)):
+        if not message.startswith(FRAME_MAGIC):
+            return bytes(message).decode("utf-8")
+        frame = decode_frame(bytes(message))
+        if frame["type"] != "json":
+            return None
+        return decompress_bytes(frame["payload"], frame["format"]).decode("utf-8")
+    if message.startswith('{"type":"compressed"'):
+        env = json_loads(message)
+        return decompress_bytes(base64.b64decode(env["data"]), env["enc"]).decode("utf-8")
+    return message
+
+
+def _serve(port):
+    import asyncio
+    import websockets
+
+    from HeartbeatDelta import apply_merge_patch
+
+    async def handler(ws):
+        print("client connected")
+        hb_states = {}
+        async for message in ws:
+            size = len(message)
+            if isinstance(message, (bytes, bytearray)):
+                frame = decode_frame(bytes(message))
+                if frame["type"] != "json":
+                    payload = frame.pop("payload")
+                    print("BIN", frame, f"{len(payload)} bytes")
+                    continue
+            message = decode_json_message(message)
+            msg = json_loads(message)
+            print("JSON", msg.get("type") or msg.get("event"), f"{size}/{len(message)} bytes", message[:200])
+            if msg.get("type") == "heartbeat" and "version" in msg:
+                if msg.get("keyframe"):
+                    hb_states[msg["version"]] = msg["state"]
+                elif msg.get("base") in hb_states:
+                    hb_states[msg["version"]] = apply_merge_patch(hb_states[msg["base"]], msg["delta"])
+                else:
+                    await ws.send(json.dumps({"type": "heartbeat_keyframe"}))
+                    continue
+                await ws.send(json.dumps({"type": "heartbeat_ack", "version": msg["version"]}))
+            caps = msg.get("capabilities")
+            if caps:
+                # pilih kompresi pertama yang ditawarkan client
+                if isinstance(caps.get("compress"), list):
+                    caps = {**caps, "compress": caps["compress"][0]}
+                await ws.send(json.dumps({"type": "capabilities", "capabilities": caps}))
+
+    async def main():
+        async with websockets.serve(handler, "0.0.0.0", port, max_size=None):
+            print(f"WSCodec test server on ws://0.0.0.0:{port}/ws")
+            await asyncio.Future()
+
+    asyncio.run(main())
+
+
+def _bench_samples():
+    """
+    Pesan WS dari builder asli bridgeservice (heartbeat, ack, sms_received,
+    audio_chunk) dengan hasil probe tetap, lewat WSClient.send → writer
+    seperti di device; tanpa adb / koneksi.
+    """
+    import tempfile
+    import types
+    import bridgeservice as bs
+
+    parts = {
+        "static": {"brand": "samsung", "model": "SM-A115F", "android": "12", "sdk": "31",
+                   "device_name": "Galaxy A11", "serial": "R58M12ABCDE", "abi": "arm64-v8a",
+                   "hardware": "qcom", "fingerprint": "samsung/a11qdd/a11q:12/SP1A.210812.016/A115FXXU3CWA1:user/release-keys",
+                   "root": {"status": False, "user": None}},
+        "sim": bs._sim_part({"sim_state": ["LOADED", "LOADED"],
+                             "imei#0": "356789012345678", "imei#1": "356789012345686",
+                             "number#0": "+6281234567890", "number#1": "+6281987654321",
+                             "iccid#0": "8962100123456789012", "iccid#1": "8962110987654321098"}),
+        "fast": {"iplocal": "192.168.1.23", "network_type": "LTE,LTE",
+                 "operator": ["TELKOMSEL", "XL"], "signal_dbm": [-87, -95]},
+    }
+    profile_service = bs.ProfileService({}, bs.assemble_device_info)
+    profile_service.seed(parts)
+
+    client = types.SimpleNamespace(
+        adb=None,
+        server_caps={},
+        profile_service=profile_service,
+        command_queue=bs.JobScheduler(bs.job_rate_keys, bs.RATE_LIMITS),
+        telemetry=bs.QueueTelemetry(),
+        result_cache=bs.ResultCache(),
+        writer=bs.WSWriter(lambda frame, msgs: True, log_fn=lambda *a: None),
+        outbox=bs.Outbox(os.path.join(tempfile.gettempdir(), "wscodec_bench_outbox.jsonl")),
+        sms=types.SimpleNamespace(scheduler=bs.PollScheduler(), tracker=bs.SmsStatusTracker(lambda e: None)),
+        ussd_paths=None,
+    )
+    for name in ("send", "_is_outboxable", "_stats_snapshot", "_build_heartbeat", "_send_ws_ack"):
+        setattr(client, name, getattr(bs.WSClient, name).__get__(client))
+    client._device_serial = lambda: "R58M12ABCDE"
+
+    client.send(client._build_heartbeat(42))
+    client._send_ws_ack("success", {
+        "device": "R58M12ABCDE", "platform": "ADB", "index": 3,
+        "result": {"ok": True, "msg": "level: 87\nstatus: 2\nhealth: 2\n" * 8}
+    }, "operator01", "7f3c2a9e4b")
+    sms = bs.SMSHandler._row_to_sms({
+        "_id": "1532", "thread_id": "41", "address": "+6281234567890", "date": "1704067200000",
+        "read": "0", "type": "1", "status": "-1",
+        "body": "Kode OTP Anda 482913. Jangan berikan kode ini kepada siapa pun."
+    })
+    client.send({"type": "sms_received", "data": {**sms, "read": True, "forwarded": True}, "serial": "R58M12ABCDE"})
+    client.send({"type": "audio_chunk", "format": "pcm16", "rate": 8000, "channels": 1, "seq": 1024,
+                 "data": base64.b64encode(os.urandom(3200)).decode("ascii")})
+
+    return {msg["type"]: msg for msg in client.writer.drain_pending()}
+
+
+def _bench(n):
+    """Micro-benchmark encode/decode pesan WS yang nyata per backend JSON."""
+    import time
+
+    samples = _bench_samples()
+
+    print(f"{'backend':8} {'message':13} {'bytes':>6} {'dumps us':>9} {'loads us':>9}")
+    for name, (dumps, loads) in JSON_BACKENDS.items():
+        for kind, msg in samples.items():
+            encoded = dumps(msg)
+            t0 = time.perf_counter()
+            for _ in range(n):
+                dumps(msg)
+            t1 = time.perf_counter()
+            for _ in range(n):
+                loads(encoded)
+            t2 = time.perf_counter()
+            print(f"{name:8} {kind:13} {len(encoded):6} {(t1 - t0) / n * 1e6:9.2f} {(t2 - t1) / n * 1e6:9.2f}")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) >= 2 and sys.argv[1] == "serve":
+        _serve(int(sys.argv[2]) if len(sys.argv) > 2 else 8765)
+    elif len(sys.argv) >= 2 and sys.argv[1] == "bench":
+        _bench(int(sys.argv[2]) if len(sys.argv) > 2 else 20000)
+    else:
+        print("usage: python WSCodec.py serve [port] | bench [n]")
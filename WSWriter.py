@@ -0,0 +1,274 @@
+import threading
+import time
+from collections import deque
+
+from WSCodec import BinaryFrame, json_dumps
+
+
+class WSWriter:
+    """
+    Satu-satunya thread yang menulis ke WebSocket.
+
+    Producer (worker, SMS poller, audio, heartbeat) cukup put(dict) tanpa
+    menunggu socket; serialisasi JSON dan ws.send dilakukan di thread ini.
+    Frame teks keluar sebagai bytes UTF-8 (encode_fn), frame biner sebagai
+    BinaryFrame.
+
+    Kelas prioritas: ack > sms > audio > heartbeat. Tiap kelas punya antrian
+    terbatas:
+    - audio: penuh → chunk paling lama dibuang (real-time)
+    - heartbeat / stats: hanya yang terbaru disimpan (coalesce)
+    - ack / sms: tunggu ruang sebentar (put_timeout), lalu dibuang + dihitung
+    Jika server mendukung "batch", pesan kecil digabung dalam satu frame
+    {"type": "batch", "messages": [...]}.
+    Pesan yang gagal dikirim diteruskan ke on_fail(msgs) (mis. outbox offline).
+
+    Tanpa start(), antrian bisa dikuras dari luar (mis. task asyncio):
+    waker dipanggil setiap ada pesan baru, lalu next_batch(0) + record().
+    """
+
+    ACK, SMS, AUDIO, HEARTBEAT = range(4)
+    CLASS_NAMES = ("ack", "sms", "audio", "heartbeat")
+
+    PRIORITY = {
+        "ack": ACK,
+        "hello": ACK,
+        "profile": ACK,
+        "ussd_result": ACK,
+        "result_chunk": ACK,
+        "sms_received": SMS,
+        "sms_debug": SMS,
+        "sms_status": SMS,
+        "audio_chunk": AUDIO,
+        "heartbeat": HEARTBEAT,
+        "stats": HEARTBEAT,
+    }
+    # type yang cukup dikirim versi terbarunya saja
+    COALESCE_TYPES = ("heartbeat",)
+
+    def __init__(self, send_fn, encode_fn=json_dumps, max_sizes=(2000, 2000, 64, 4),
+                 put_timeout=2.0, small_limit=1024, batch_bytes=16384, log_fn=print,
+                 on_fail=None):
+        self.send_fn = send_fn
+        self.on_fail = on_fail
+        self.encode_fn = encode_fn
+        self.max_sizes = max_sizes
+        self.put_timeout = put_timeout
+        self.small_limit = small_limit
+        self.batch_bytes = batch_bytes
+        self.log = log_fn
+        self.batch_enabled = False
+        # PayloadCompressor (WSCodec) jika server mendukung kompresi
+        self.compressor = None
+        # dipanggil (thread mana pun) saat ada pesan baru, untuk konsumer async
+        self.waker = None
+
+        self._queues = [deque() for _ in self.CLASS_NAMES]
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        self.sent = 0
+        self.frames = 0
+        self.dropped = [0] * len(self.CLASS_NAMES)
+
+    # ==================================================
+    # PRODUCER API
+    # ==================================================
+    def classify(self, msg):
+        kind = (msg.get("type") or msg.get("event")) if isinstance(msg, dict) else None
+        return self.PRIORITY.get(kind, self.SMS)
+
+    def put(self, msg, cls=None):
+        """
+        Masukkan pesan ke antrian; return False jika dibuang karena penuh.
+        msg boleh dict (di-encode JSON) atau BinaryFrame (cls wajib diisi).
+        """
+        if cls is None:
+            cls = self.classify(msg)
+        q = self._queues[cls]
+        limit = self.max_sizes[cls]
+
+        with self._cond:
+            if isinstance(msg, dict) and msg.get("type") in self.COALESCE_TYPES:
+                for i, pending in enumerate(q):
+                    if isinstance(pending, dict) and pending.get("type") == msg.get("type"):
+                        del q[i]
+                        break
+
+            if len(q) >= limit:
+                if cls in (self.AUDIO, self.HEARTBEAT):
+                    q.popleft()
+                    self.dropped[cls] += 1
+                else:
+                    deadline = time.time() + self.put_timeout
+                    while len(q) >= limit:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            self.dropped[cls] += 1
+                            self.log(f"⚠️ WS outbound queue full, drop {self.CLASS_NAMES[cls]}")
+                            return False
+                        self._cond.wait(remaining)
+
+            q.append(msg)
+            self._cond.notify_all()
+        self._wake()
+        return True
+
+    def wait_room(self, cls, limit, timeout=None):
+        """Tunggu sampai antrian kelas cls < limit (backpressure producer stream)."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while len(self._queues[cls]) >= limit:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def put_front(self, msgs, on_queued=None):
+        """
+        Masukkan pesan ke depan antrian kelasnya (urutan msgs dipertahankan).
+        on_queued() dipanggil selagi lock antrian masih dipegang, sebelum
+        writer dibangunkan (mis. menandai koneksi siap).
+        """
+        with self._cond:
+            for msg in reversed(msgs):
+                self._queues[self.classify(msg)].appendleft(msg)
+            if on_queued:
+                on_queued()
+            self._cond.notify_all()
+        self._wake()
+
+    def _wake(self):
+        if self.waker:
+            try:
+                self.waker()
+            except Exception:
+                pass
+
+    def drain_pending(self):
+        """Kosongkan semua antrian dan kembalikan pesannya (urut prioritas)."""
+        with self._cond:
+            msgs = []
+            for q in self._queues:
+                msgs.extend(q)
+                q.clear()
+            self._cond.notify_all()
+            return msgs
+
+    def pending(self):
+        with self._cond:
+            return sum(len(q) for q in self._queues)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": {n: len(q) for n, q in zip(self.CLASS_NAMES, self._queues)},
+                "dropped": dict(zip(self.CLASS_NAMES, self.dropped)),
+                "sent": self.sent,
+                "frames": self.frames,
+                "compression": self.compressor.stats() if self.compressor else None
+            }
+
+    # ==================================================
+    # WRITER
+    # ==================================================
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def next_batch(self, timeout=None):
+        """
+        Ambil pesan berikutnya (prioritas tertinggi) sebagai list (frame, msgs).
+        Pesan kecil dari kelas yang sama digabung jika batch_enabled.
+        """
+        with self._cond:
+            if not any(self._queues):
+                self._cond.wait(timeout)
+            for q in self._queues:
+                if q:
+                    first = q.popleft()
+                    group = [first]
+                    if self.batch_enabled:
+                        while q and len(group) < 50:
+                            group.append(q.popleft())
+                    self._cond.notify_all()
+                    break
+            else:
+                return []
+
+        return self._encode(group)
+
+    def _encode(self, group):
+        frames = []
+        batch, batch_msgs, size = [], [], 0
+
+        def flush_batch():
+            if not batch:
+                return
+            if len(batch) == 1:
+                frames.append((batch[0], list(batch_msgs)))
+            else:
+                frames.append((b'{"type":"batch","messages":[' + b",".join(batch) + b']}', list(batch_msgs)))
+            batch.clear()
+            batch_msgs.clear()
+
+        for msg in group:
+            try:
+                payload = msg if isinstance(msg, (str, bytes, bytearray)) else self.encode_fn(msg)
+                if isinstance(payload, str):
+                    payload = payload.encode("utf-8")
+            except Exception as e:
+                self.log(f"❌ WS encode error: {e}")
+                continue
+
+            if (
+                not self.batch_enabled
+                or isinstance(payload, BinaryFrame)
+                or len(payload) > self.small_limit
+            ):
+                flush_batch()
+                if self.compressor:
+                    payload = self.compressor.maybe_compress(payload)
+                frames.append((payload, [msg]))
+                continue
+
+            if size + len(payload) > self.batch_bytes:
+                flush_batch()
+                size = 0
+            batch.append(payload)
+            batch_msgs.append(msg)
+            size += len(payload)
+
+        flush_batch()
+        return frames
+
+    def record(self, msgs, ok):
+        """Catat hasil kirim satu frame; yang gagal diteruskan ke on_fail."""
+        if ok:
+            self.sent += len(msgs)
+            self.frames += 1
+        elif self.on_fail:
+            try:
+                self.on_fail(msgs)
+            except Exception as e:
+                self.log(f"⚠️ WS writer on_fail error: {e}")
+
+    def _run(self):
+        while self._running:
+            for frame, msgs in self.next_batch(timeout=1.0):
+                try:
+                    ok = self.send_fn(frame, msgs)
+                except Exception as e:
+                    self.log(f"⚠️ WS writer send error: {e}")
+                    ok = False
+                self.record(msgs, ok)
@@ -12,15 +12,20 @@ import re
 import json
 import time
 import uuid
+import codecs
 import base64
+import random
+import shlex
+import signal
 import threading
 import subprocess
 import sys
 from PIL.DdsImagePlugin import item
 import requests
 import urllib.parse  # Pindah import ke atas
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from datetime import datetime, timezone
-from queue import Queue
 
 
 try:
@@ -43,18 +48,159 @@ try:
     ADBUTILS_AVAILABLE = True
 except Exception:
     ADBUTILS_AVAILABLE = False
+
+ASYNC_WS_AVAILABLE = False
+try:
+    from AsyncWSTransport import AsyncWSTransport
+    ASYNC_WS_AVAILABLE = True
+except Exception:
+    ASYNC_WS_AVAILABLE = False
  
 # Local modules
 try:
     from WhatsAppAutomation import WhatsAppAutomation
     from CallAudioForwarder import CallAudioForwarder
     from UICallController import UICallController
+    from JobJournal import JobJournal
+    from JobScheduler import JobScheduler
+    from ResultCache import ResultCache
+    from QueueTelemetry import QueueTelemetry
+    from WSWriter import WSWriter
+    from Outbox import Outbox
+    from HeartbeatDelta import HeartbeatDelta
+    from ProfileService import ProfileService
+    from Parcel import parse_parcel
+    from SeenIds import SeenIds
+    from PollScheduler import PollScheduler
+    from SmsStatusTracker import SmsStatusTracker
+    from UssdSession import UssdSession
+    from UssdPathCache import UssdPathCache, chain_ussd_code
+    from WSCodec import (
+        encode_frame, available_compressors, PayloadCompressor, BinaryFrame,
+        json_loads, JSON_DECODE_ERRORS, FRAME_SCREENSHOT, FRAME_VERSION
+    )
 except Exception as e:
     print('Warning: local modules import issue:', e)
 
 WS_SERVER = os.environ.get("BRIDGE_WS", "wss://ws.autocall.my.id/ws")
 HEARTBEAT_INTERVAL = int(os.environ.get("HEARTBEAT_INTERVAL", 1200))  # 20 minutes default
 POLL_SMS_INTERVAL = 3
+# SMS masuk: sumber (auto | content | termux), state watermark _id, halaman termux-sms-list
+SMS_SOURCE = os.environ.get("SMS_SOURCE", "auto").lower()
+# auto: content://sms gagal SMS_CONTENT_FAILS kali berturut-turut → termux-sms-list
+# selama SMS_CONTENT_RETRY detik, lalu content dicoba lagi
+SMS_CONTENT_FAILS = int(os.environ.get("SMS_CONTENT_FAILS", 3))
+SMS_CONTENT_RETRY = float(os.environ.get("SMS_CONTENT_RETRY", 600))
+SMS_STATE_PATH = os.environ.get("SMS_STATE_PATH", os.path.join(os.getcwd(), "bridgeservice_sms.json"))
+SMS_PAGE_SIZE = int(os.environ.get("SMS_PAGE_SIZE", 20))
+SMS_MAX_PAGES = int(os.environ.get("SMS_MAX_PAGES", 10))
+SMS_SEEN_MAX = int(os.environ.get("SMS_SEEN_MAX", 2000))
+# poll adaptif: POLL_SMS_INTERVAL saat aktif, mundur sampai SMS_POLL_MAX saat sepi,
+# rapat lagi selama SMS_EXPECT_WINDOW detik setelah kirim SMS / USSD
+SMS_POLL_MAX = float(os.environ.get("SMS_POLL_MAX", 60))
+SMS_POLL_BACKOFF = float(os.environ.get("SMS_POLL_BACKOFF", 1.5))
+SMS_EXPECT_WINDOW = float(os.environ.get("SMS_EXPECT_WINDOW", 120))
+# watcher SMS masuk (logcat radio) untuk poll segera; "off" untuk mematikan
+SMS_WATCH = os.environ.get("SMS_WATCH", "logcat").lower()
+# setiap (re)start ditambah -T '<waktu>' (baris sejak baris terakhir yang
+# terlihat / sejak watcher mulai), jadi -v time diperlukan untuk cutoff
+SMS_WATCH_CMD = os.environ.get("SMS_WATCH_CMD", "logcat -b radio -v time -s GsmInboundSmsHandler InboundSmsHandler")
+# kirim SMS massal: jeda antar kirim dalam satu lane SIM, batas segmen per kirim,
+# maks nomor yang digabung dalam satu termux-sms-send (-n a,b,c) untuk teks sama
+SMS_BULK_DELAY = float(os.environ.get("SMS_BULK_DELAY", 1))
+SMS_MAX_PARTS = int(os.environ.get("SMS_MAX_PARTS", 10))
+SMS_MERGE_MAX = int(os.environ.get("SMS_MERGE_MAX", 10))
+# tracking status SMS keluar dari content://sms (detik sampai "unconfirmed")
+SMS_TRACK_TIMEOUT = float(os.environ.get("SMS_TRACK_TIMEOUT", 300))
+SMS_WATCH_PATTERN = re.compile(os.environ.get("SMS_WATCH_PATTERN", "InboundSms").encode())
+# timestamp baris logcat -v time ("MM-DD hh:mm:ss.mmm")
+LOGCAT_TIME = re.compile(rb"^(\d\d-\d\d \d\d:\d\d:\d\d\.\d{3})")
+# asyncio (websockets, satu event loop) atau thread (websocket-client)
+WS_TRANSPORT = os.environ.get("WS_TRANSPORT", "asyncio" if ASYNC_WS_AVAILABLE else "thread").lower()
+# fitur protokol opsional yang dimengerti client ini (diumumkan saat open)
+CLIENT_CAPABILITIES = {
+    "batch": True, "binary": FRAME_VERSION, "compress": available_compressors(),
+    "heartbeat_delta": 1
+}
+# heartbeat delta: keyframe (state lengkap) setiap N heartbeat
+HEARTBEAT_KEYFRAME_EVERY = int(os.environ.get("HEARTBEAT_KEYFRAME_EVERY", 10))
+# payload JSON >= threshold (byte) dikompres jika server mendukung
+COMPRESS_THRESHOLD = int(os.environ.get("COMPRESS_THRESHOLD", 1024))
+JOB_JOURNAL_PATH = os.environ.get("JOB_JOURNAL_PATH", os.path.join(os.getcwd(), "bridgeservice_jobs.db"))
+JOB_REPLAY = os.environ.get("JOB_REPLAY", "at-most-once").lower()  # at-most-once | retry
+
+# Reconnect: exponential backoff + full jitter (detik); hanya retry pertama
+# setelah koneksi stabil RECONNECT_STABLE detik yang langsung (counter di-reset)
+RECONNECT_BASE = float(os.environ.get("RECONNECT_BASE", 1))
+RECONNECT_MAX = float(os.environ.get("RECONNECT_MAX", 60))
+RECONNECT_STABLE = float(os.environ.get("RECONNECT_STABLE", 30))
+
+# Output ADB/CMD: sampai RESULT_INLINE_MAX byte dikirim utuh di ack; lebih
+# dari itu dikirim bertahap sebagai result_chunk (~STREAM_CHUNK_SIZE byte),
+# maksimal STREAM_MAX_INFLIGHT chunk menunggu di writer. Saat WS putus stream
+# berhenti sementara, dan dibatalkan jika belum tersambung lagi dalam
+# STREAM_PAUSE_MAX detik (chunk tidak pernah masuk outbox)
+RESULT_INLINE_MAX = int(os.environ.get("RESULT_INLINE_MAX", 64 * 1024))
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", 16 * 1024))
+STREAM_MAX_INFLIGHT = int(os.environ.get("STREAM_MAX_INFLIGHT", 8))
+STREAM_PAUSE_MAX = float(os.environ.get("STREAM_PAUSE_MAX", 30))
+
+# probe get_device_info jalan paralel; probe yang melewati PROBE_TIMEOUT
+# (detik, per probe: shell adb-nya dimatikan, dan untuk seluruh fan-out)
+# diisi default dan hasilnya parsial
+PROBE_WORKERS = int(os.environ.get("PROBE_WORKERS", 6))
+PROBE_TIMEOUT = float(os.environ.get("PROBE_TIMEOUT", 8))
+PROBE_DEFAULTS = {
+    "root": {"status": False, "user": None},
+    "iplocal": "0.0.0.0",
+    "operator": [],
+    "signal_dbm": [],
+    "sim_state": [],
+    "imei": None,
+    "number": None,
+    "iccid": None
+}
+
+# kode transaksi `service call iphonesubinfo` per SDK minimum (kode + slot).
+# Tambah / override lewat env IPHONESUBINFO_CODES, mis. '{"29": {"imei": 4}}'
+IPHONESUBINFO_CODES = {
+    0: {"imei": 1, "number": 7, "iccid": 11},
+}
+try:
+    for _sdk, _codes in json.loads(os.environ.get("IPHONESUBINFO_CODES") or "{}").items():
+        IPHONESUBINFO_CODES.setdefault(int(_sdk), {}).update(_codes)
+except Exception as e:
+    print("IPHONESUBINFO_CODES invalid:", e)
+
+# profil device terakhir, dikirim langsung saat open lalu di-refresh di background
+PROFILE_CACHE_PATH = os.environ.get("PROFILE_CACHE_PATH", os.path.join(os.getcwd(), "bridgeservice_profile.json"))
+# jadwal ProfileService (detik): jaringan/sinyal, cek gsm.sim.state, umur maks data SIM
+PROFILE_FAST_INTERVAL = int(os.environ.get("PROFILE_FAST_INTERVAL", 10))
+PROFILE_SIM_CHECK = int(os.environ.get("PROFILE_SIM_CHECK", 15))
+PROFILE_SIM_MAX_AGE = int(os.environ.get("PROFILE_SIM_MAX_AGE", 3600))
+
+# cache jalur menu USSD (operator, sim, code, keywords) → pilihan; "off" untuk mematikan.
+# USSD_CHAIN=0 mematikan percobaan kode berantai (*123*2*2#), cukup replay pilihan
+USSD_PATH_CACHE = os.environ.get("USSD_PATH_CACHE", os.path.join(os.getcwd(), "bridgeservice_ussd_paths.json"))
+USSD_CHAIN = os.environ.get("USSD_CHAIN", "1").lower() not in ("0", "false", "off")
+USSD_CHAIN_MATCH = float(os.environ.get("USSD_CHAIN_MATCH", 0.6))
+
+# Outbox pesan keluar selama WS putus (memori + spill ke disk)
+OUTBOX_PATH = os.environ.get("OUTBOX_PATH", os.path.join(os.getcwd(), "bridgeservice_outbox.jsonl"))
+OUTBOX_MAX = int(os.environ.get("OUTBOX_MAX", 5000))
+OUTBOX_MAX_AGE = int(os.environ.get("OUTBOX_MAX_AGE", 86400))  # detik
+
+# Token bucket per platform / SIM / app, override lewat env RATE_LIMITS (JSON),
+# contoh: {"platform:SMS": {"rate": 10, "per": 60, "burst": 3}, "sim:*": {"rate": 20}}
+DEFAULT_RATE_LIMITS = {
+    "sim:*": {"rate": 20, "per": 60, "burst": 5},
+    "app:*": {"rate": 20, "per": 60, "burst": 5},
+}
+try:
+    RATE_LIMITS = json.loads(os.environ["RATE_LIMITS"]) if os.environ.get("RATE_LIMITS") else DEFAULT_RATE_LIMITS
+except Exception as e:
+    print("Invalid RATE_LIMITS, using defaults:", e)
+    RATE_LIMITS = DEFAULT_RATE_LIMITS
 LOADING_KEYWORDS = [
     "running", "ussd code running",
     "memproses", "loading", "please wait"
@@ -64,12 +210,24 @@ ERROR_KEYWORDS = [
     "mmi", "connection problem", "invalid"
 ]
 
-def check_device_status(serial):
+_HTTP_SESSION = None
+
+def http_session():
+    """requests.Session bersama (koneksi keep-alive) untuk API registrasi/status."""
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None:
+        _HTTP_SESSION = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=4)
+        _HTTP_SESSION.mount("https://", adapter)
+        _HTTP_SESSION.mount("http://", adapter)
+    return _HTTP_SESSION
+
+def check_device_status(serial, session=None):
     url = "https://mrjay59.com/api/cpost/device/state" 
     payload = {"serial": serial,"tipe": "cekstate"}
 
     try:
-        r = requests.post(url, json=payload, timeout=5)
+        r = (session or http_session()).post(url, json=payload, timeout=5)
         if r.status_code == 200:
             print("Server response:", r.text)
             data = r.json()        
@@ -81,22 +239,66 @@ def check_device_status(serial):
         print("❌ Connection error:", e)
         return False
 
-def run_local(cmd, capture=True):
+def _kill_tree(proc, cmd):
+    """Matikan proses; command shell (session sendiri) dimatikan satu grup (sh + anak pipeline)."""
+    if proc.poll() is not None:
+        return
+    try:
+        if isinstance(cmd, (list, tuple)):
+            proc.kill()
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        proc.kill()
+
+def run_local(cmd, capture=True, timeout=60):
+    proc = None
     try:
         if isinstance(cmd, (list, tuple)):
             proc = subprocess.Popen(cmd, stdout=subprocess.PIPE if capture else None,
                                     stderr=subprocess.PIPE if capture else None)
         else:
+            # session sendiri: saat timeout seluruh grup proses (sh + adb) dimatikan
             proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE if capture else None,
-                                    stderr=subprocess.PIPE if capture else None)
-        out, err = proc.communicate(timeout=60)
+                                    stderr=subprocess.PIPE if capture else None,
+                                    start_new_session=True)
+        out, err = proc.communicate(timeout=timeout)
         if capture and out is not None:
             return out.decode('utf-8', errors='ignore')
         return None
     except Exception as e:
-        # timeout or other
+        # timeout or other: proses yang masih jalan dimatikan
+        if proc is not None:
+            _kill_tree(proc, cmd)
+            proc.wait()
         return None
 
+def run_local_stream(cmd, timeout=60, read_size=8192):
+    """
+    Seperti run_local, tapi stdout dibaca bertahap (generator bytes).
+    timeout=None: tanpa batas (mis. watcher logcat).
+    """
+    shell = not isinstance(cmd, (list, tuple))
+    proc = subprocess.Popen(cmd, shell=shell, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            start_new_session=shell)
+    # grup proses ikut dimatikan: anak pipeline yang memegang stdout tidak
+    # membuat read1 tertahan melewati timeout
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, _kill_tree, (proc, cmd))
+        timer.start()
+    try:
+        while True:
+            data = proc.stdout.read1(read_size)
+            if not data:
+                break
+            yield data
+    finally:
+        if timer:
+            timer.cancel()
+        _kill_tree(proc, cmd)
+        proc.wait()
+
 class AdbWrapper:
     def __init__(self):
         self.adb_client = None
@@ -106,16 +308,40 @@ class AdbWrapper:
             except Exception:
                 self.adb_client = None
 
-    def shell(self, cmd):
+    def shell(self, cmd, timeout=None):
+        # di dalam probe: sisa waktu probe jadi batas shell
+        if timeout is None:
+            timeout = _probe_remaining()
+            if timeout is not None and timeout <= 0:
+                return ""
         try:
             if self.adb_client:
-                return self.adb_client.shell(cmd) or ""
+                return self.adb_client.shell(cmd, timeout=timeout) or ""
             else:
-                out = run_local(f"adb shell {cmd}")
+                # satu argumen: ; | > " dst. diinterpretasi shell device, bukan lokal
+                out = run_local(f"adb shell {shlex.quote(cmd)}", timeout=timeout or 60)
                 return out or ""
         except Exception as e:
             return ""
 
+    def shell_stream(self, cmd, read_size=8192, timeout=60):
+        """
+        Output shell bertahap (generator bytes), tanpa menampung semuanya.
+        timeout=None untuk stream tanpa batas (mis. logcat).
+        """
+        if self.adb_client:
+            conn = self.adb_client.shell(cmd, stream=True)
+            try:
+                while True:
+                    data = conn.read(read_size)
+                    if not data:
+                        break
+                    yield data
+            finally:
+                conn.close()
+        else:
+            yield from run_local_stream(f"adb shell {shlex.quote(cmd)}", timeout=timeout, read_size=read_size)
+
     def pull(self, remote, local):
         try:
             if self.adb_client:
@@ -174,77 +400,237 @@ def get_root_info():
             "user": None
         }
     
-def get_device_info(adb: AdbWrapper):
+def parse_content_rows(text, columns):
+    """
+    Parse output `content query`: "Row: N k1=v1, k2=v2, ..." (urutan = columns).
+    Kolom terakhir diambil sampai akhir baris, jadi boleh berisi ", " / newline.
+    """
+    rows = []
+    for chunk in re.split(r"(?m)^(?=Row: \d+ )", text or ""):
+        m = re.match(r"Row: \d+ ", chunk)
+        if not m:
+            continue
+        rest = chunk[m.end():].rstrip("\r\n")
+        row = {}
+        for i, col in enumerate(columns):
+            if not rest.startswith(col + "="):
+                break
+            rest = rest[len(col) + 1:]
+            if i == len(columns) - 1:
+                value = rest
+            else:
+                idx = rest.find(f", {columns[i + 1]}=")
+                if idx < 0:
+                    break
+                value, rest = rest[:idx], rest[idx + 2:]
+            row[col] = None if value == "NULL" else value
+        if len(row) == len(columns):
+            rows.append(row)
+    return rows
+
+def content_query(adb, uri, columns, where=None, sort=None):
+    """
+    `content query` lewat adb shell → list dict per baris ([] jika kosong),
+    None jika provider tidak bisa dibaca (izin ditolak / error).
+    """
+    cmd = f"content query --uri {uri} --projection {':'.join(columns)}"
+    if where:
+        cmd += f" --where {shlex.quote(where)}"
+    if sort:
+        cmd += f" --sort {shlex.quote(sort)}"
+    out = (adb.shell(cmd) or "").strip()
+    if out.startswith("No result found"):
+        return []
+    if not out.startswith("Row:"):
+        return None
+    return parse_content_rows(out, columns)
+
+def _safe_shell(adb, cmd):
     try:
-        def safe(cmd):
-            try:
-                return adb.shell(cmd).strip()
-            except:
-                return ""
+        return adb.shell(cmd).strip()
+    except:
+        return ""
 
-        iplocal = get_local_ip(adb)
-
-        brand = safe("getprop ro.product.manufacturer")
-        model = safe("getprop ro.product.model")
-        android = safe("getprop ro.build.version.release")
-        sdk = safe("getprop ro.build.version.sdk")
-
-        # Device name (About phone)
-        device_name = safe("settings get global device_name")
-        if not device_name or device_name == "null":
-            device_name = safe("settings get secure device_name")
-        if not device_name or device_name == "null":
-            device_name = safe("getprop ro.product.device")
-
-        # Identitas unik
-        serial = safe("getprop ro.serialno")
-        if not serial or serial == "unknown":
-            serial = safe("settings get secure android_id")
-
-        # Hardware info
-        abi = safe("getprop ro.product.cpu.abi")
-        hardware = safe("getprop ro.hardware")
-        fingerprint = safe("getprop ro.build.fingerprint")
-
-        # Root check
-        root_status = get_root_info()
-
-        # Network
-        network = safe("getprop gsm.network.type")
-
-        # SIM / Card Info
-        imei_list = get_all_imei(adb)
-        number_list = get_all_numbers(adb)
-        operator_list = get_operator(adb)
-        signal_list = get_signal_strength(adb)
-        iccid_list = get_all_iccid(adb)
-        sim_state_list = get_sim_state(adb)
-
-        cardinfo = {
-            "network_type": network,
-            "operator": operator_list,
-            "signal_dbm": signal_list,
-            "iccid": iccid_list,
-            "imei": imei_list,
-            "number": number_list,
-            "sim_state": sim_state_list,
-            "dual_sim": len(sim_state_list) > 1
-        }
+_PROBE_POOL = None
+_PROBE_POOL_LOCK = threading.Lock()
+# deadline probe yang sedang jalan di thread ini (dibaca AdbWrapper.shell)
+_PROBE_DEADLINE = threading.local()
 
-        return {
-            "brand": brand,
-            "model": model,
-            "android": android,
-            "sdk": sdk,
-            "device_name": device_name,
-            "serial": serial,
-            "abi": abi,
-            "hardware": hardware,
-            "fingerprint": fingerprint,
-            "root": root_status,
-            "iplocal": iplocal,
-            "cardinfo": cardinfo
-        }
+def _probe_remaining():
+    deadline = getattr(_PROBE_DEADLINE, "value", None)
+    return None if deadline is None else deadline - time.time()
+
+def _run_probe(fn, timeout):
+    _PROBE_DEADLINE.value = time.time() + timeout
+    try:
+        result = fn()
+        # shell yang dimatikan karena deadline mengembalikan "", bukan hasil
+        if _probe_remaining() <= 0:
+            raise FuturesTimeout()
+        return result
+    finally:
+        _PROBE_DEADLINE.value = None
+
+def _probe_pool():
+    global _PROBE_POOL
+    with _PROBE_POOL_LOCK:
+        if _PROBE_POOL is None:
+            _PROBE_POOL = ThreadPoolExecutor(max_workers=PROBE_WORKERS, thread_name_prefix="probe")
+        return _PROBE_POOL
+
+def run_probes(probes, timeout=None, partial=True):
+    """
+    Jalankan probe (name → fn) paralel di thread pool bersama. Tiap probe
+    punya batas waktu sendiri (shell adb-nya ikut dibatasi); yang belum
+    mulai saat batas fan-out habis dibatalkan. Probe yang error / timeout
+    diisi PROBE_DEFAULTS (hasil parsial), atau return None jika partial=False
+    dan ada yang timeout (nilai default jangan dianggap perubahan profil).
+    """
+    timeout = PROBE_TIMEOUT if timeout is None else timeout
+    pool = _probe_pool()
+    futures = {name: pool.submit(_run_probe, fn, timeout) for name, fn in probes.items()}
+    deadline = time.time() + timeout
+    results = {}
+    timed_out = []
+    for name, fut in futures.items():
+        try:
+            results[name] = fut.result(timeout=max(0, deadline - time.time()))
+        except FuturesTimeout:
+            fut.cancel()
+            timed_out.append(name)
+            results[name] = PROBE_DEFAULTS.get(name.split("#")[0], "")
+        except Exception as e:
+            log_print(f"probe {name} error: {e}", "WARN")
+            results[name] = PROBE_DEFAULTS.get(name.split("#")[0], "")
+    if timed_out:
+        log_print(f"probe timeout: {', '.join(timed_out)}", "WARN")
+        if not partial:
+            return None
+    return results
+
+def _merge_slots(results, name):
+    """Gabung hasil probe per slot (name#0, name#1) jadi list unik."""
+    values = []
+    for slot in range(2):
+        val = results.pop(f"{name}#{slot}", None)
+        if val and val not in values:
+            values.append(val)
+    return values
+
+def _device_name(adb):
+    # Device name (About phone)
+    device_name = _safe_shell(adb, "settings get global device_name")
+    if not device_name or device_name == "null":
+        device_name = _safe_shell(adb, "settings get secure device_name")
+    if not device_name or device_name == "null":
+        device_name = _safe_shell(adb, "getprop ro.product.device")
+    return device_name
+
+def _device_id(adb):
+    # Identitas unik
+    serial = _safe_shell(adb, "getprop ro.serialno")
+    if not serial or serial == "unknown":
+        serial = _safe_shell(adb, "settings get secure android_id")
+    return serial
+
+def _static_probes(adb):
+    prop = lambda name: (lambda: _safe_shell(adb, f"getprop {name}"))
+    return {
+        "brand": prop("ro.product.manufacturer"),
+        "model": prop("ro.product.model"),
+        "android": prop("ro.build.version.release"),
+        "sdk": prop("ro.build.version.sdk"),
+        "device_name": lambda: _device_name(adb),
+        "serial": lambda: _device_id(adb),
+        "abi": prop("ro.product.cpu.abi"),
+        "hardware": prop("ro.hardware"),
+        "fingerprint": prop("ro.build.fingerprint"),
+        "root": get_root_info
+    }
+
+def _sim_probes(adb):
+    probes = {"sim_state": lambda: get_sim_state(adb)}
+    for slot in range(2):
+        probes[f"imei#{slot}"] = lambda slot=slot: get_imei(adb, slot)
+        probes[f"number#{slot}"] = lambda slot=slot: get_sim_info(adb, slot).get("number")
+        probes[f"iccid#{slot}"] = lambda slot=slot: get_iccid(adb, slot)
+    return probes
+
+def _network_probes(adb):
+    return {
+        "iplocal": lambda: get_local_ip(adb),
+        "network_type": lambda: _safe_shell(adb, "getprop gsm.network.type"),
+        "operator": lambda: get_operator(adb),
+        "signal_dbm": lambda: get_signal_strength(adb)
+    }
+
+def _sim_part(results):
+    part = {
+        "imei": _merge_slots(results, "imei"),
+        "number": _merge_slots(results, "number"),
+        "iccid": _merge_slots(results, "iccid"),
+        "sim_state": results.get("sim_state") or []
+    }
+    part["dual_sim"] = len(part["sim_state"]) > 1
+    return part
+
+# tier ProfileService: None jika ada probe timeout (tier dicoba lagi nanti)
+def get_static_info(adb: AdbWrapper):
+    """Field yang tidak berubah selama service jalan (build props, root)."""
+    return run_probes(_static_probes(adb), partial=False)
+
+def get_sim_card_info(adb: AdbWrapper):
+    """Field kartu SIM (berubah saat SIM dicabut / diganti)."""
+    results = run_probes(_sim_probes(adb), partial=False)
+    return _sim_part(results) if results is not None else None
+
+def get_network_info(adb: AdbWrapper):
+    """Field yang cepat berubah (jaringan, sinyal, IP)."""
+    return run_probes(_network_probes(adb), partial=False)
+
+def assemble_device_info(parts):
+    """Susun hasil tier (static, sim, fast) ke format get_device_info."""
+    static = parts.get("static") or {}
+    sim = parts.get("sim") or {}
+    fast = parts.get("fast") or {}
+
+    cardinfo = {
+        "network_type": fast.get("network_type", ""),
+        "operator": fast.get("operator", []),
+        "signal_dbm": fast.get("signal_dbm", []),
+        "iccid": sim.get("iccid", []),
+        "imei": sim.get("imei", []),
+        "number": sim.get("number", []),
+        "sim_state": sim.get("sim_state", []),
+        "dual_sim": sim.get("dual_sim", False)
+    }
+
+    return {**static, "iplocal": fast.get("iplocal", "0.0.0.0"), "cardinfo": cardinfo}
+
+def collect_device_parts(adb: AdbWrapper):
+    """
+    Semua probe profil dalam satu fan-out (tanpa menunggu per tier).
+    Return {"static", "sim", "fast"} (format ProfileService) + "slots"
+    (nomor per slot SIM, untuk registrasi).
+    """
+    static, sim, fast = _static_probes(adb), _sim_probes(adb), _network_probes(adb)
+    results = run_probes({**static, **sim, **fast})
+    slots = [{"number": results.get(f"number#{slot}")} for slot in range(2)]
+    return {
+        "static": {k: results[k] for k in static},
+        "sim": _sim_part({k: results[k] for k in sim}),
+        "fast": {k: results[k] for k in fast},
+        "slots": slots
+    }
+
+def build_profile(parts, serial):
+    """Profil yang dikirim di WS hello / registrasi dari hasil collect_device_parts."""
+    device_info = assemble_device_info(parts)
+    return {"platform": "termux", "device": device_info, "serial": serial, "ip_local": device_info.get("iplocal")}
+
+def get_device_info(adb: AdbWrapper):
+    try:
+        return assemble_device_info(collect_device_parts(adb))
 
     except Exception as e:
         print("get_device_info error:", e)
@@ -257,25 +643,52 @@ def get_sim_state(adb):
     except:
         return []
         
-def get_iccid(adb, slot=0):
+_DEVICE_SDK = None
+
+def get_device_sdk(adb):
+    global _DEVICE_SDK
+    if _DEVICE_SDK is None:
+        try:
+            _DEVICE_SDK = int(_safe_shell(adb, "getprop ro.build.version.sdk") or 0)
+        except ValueError:
+            _DEVICE_SDK = 0
+    return _DEVICE_SDK
+
+def iphonesubinfo_code(adb, field, slot=0):
+    """Kode transaksi untuk field (imei/number/iccid) di SDK device ini."""
+    sdk = get_device_sdk(adb)
+    codes = {}
+    for min_sdk in sorted(IPHONESUBINFO_CODES):
+        if min_sdk <= sdk:
+            codes.update(IPHONESUBINFO_CODES[min_sdk])
+    return codes[field] + slot
+
+_SU_USABLE = True
+
+def call_iphonesubinfo(adb, field, slot=0, root=False):
+    """`service call iphonesubinfo` → ParcelResult (status, value, error)."""
+    global _SU_USABLE
+    cmd = f"service call iphonesubinfo {iphonesubinfo_code(adb, field, slot)}"
+    if root:
+        if not _SU_USABLE:
+            return parse_parcel("")
+        cmd = f'su -c "{cmd}"'
     try:
-        out = adb.shell(f"service call iphonesubinfo {11+slot}") or ""
-        matches = re.findall(r"'(.*?)'", out)
-        iccid = ''.join(matches).replace('.', '').strip()
-        if iccid and len(iccid) > 10:
-            return iccid
-    except:
-        pass
+        res = parse_parcel(adb.shell(cmd))
+    except Exception as e:
+        res = parse_parcel(str(e))
+    if root and res.status is None:
+        # su tidak ada / ditolak: jangan dicoba lagi di call berikutnya
+        _SU_USABLE = False
+    return res
+
+def get_iccid(adb, slot=0):
+    res = call_iphonesubinfo(adb, "iccid", slot)
+    iccid = (res.value or "").strip() if res.ok else ""
+    if iccid and len(iccid) > 10:
+        return iccid
     return None
 
-def get_all_iccid(adb):
-    iccids = []
-    for slot in range(2):
-        val = get_iccid(adb, slot)
-        if val and val not in iccids:
-            iccids.append(val)
-    return iccids
-    
 def get_signal_strength(adb):
     try:
         out = adb.shell("dumpsys telephony.registry | grep -i 'mSignalStrength'") or ""
@@ -295,23 +708,6 @@ def get_operator(adb):
     except:
         return []
     
-def get_all_imei(adb):
-    imeis = []
-    for slot in range(2):  # support dual sim
-        imei = get_imei(adb, slot)
-        if imei and imei not in imeis:
-            imeis.append(imei)
-    return imeis
-
-def get_all_numbers(adb):
-    numbers = []
-    for slot in range(2):
-        sim = get_sim_info(adb, slot)
-        num = sim.get("number")
-        if num and num not in numbers:
-            numbers.append(num)
-    return numbers
-
 def get_serial(adb: AdbWrapper):    
     try:
         s = adb.shell("getprop ro.serialno").strip()
@@ -322,68 +718,45 @@ def get_serial(adb: AdbWrapper):
         return None
 
 def get_imei(adb: AdbWrapper, slot=0):
-    try:
-        out = adb.shell(f"service call iphonesubinfo {1+slot}") or ""
-        matches = re.findall(r"\'(.*?)\'", out)
-        imei = ''.join(matches).replace('.', '').replace(' ', '') if matches else None
-        return imei or None
-    except Exception:
-        return None
+    res = call_iphonesubinfo(adb, "imei", slot)
+    imei = (res.value or "").replace(' ', '') if res.ok else ""
+    return imei or None
   
 def get_sim_info(adb: 'AdbWrapper', slot=0):
     """
     Mengambil informasi nomor SIM dari device via ADB.
     Menggunakan metode adb.shell() dari class AdbWrapper.
     """
-    info = {}
-    cmds = [
-        f"service call iphonesubinfo {slot + 7}",
-        "dumpsys telephony.registry | grep -m 1 'mLine1Number'",
-        "dumpsys subscription | grep -m 1 'number'"
-    ]
-
-    # Jalankan semua perintah secara berurutan
-    for cmd in cmds:
-        try:
-            result = adb.shell(cmd).strip()
-            if not result:
-                # coba pakai su -c jika root diaktifkan
-                result = adb.shell(f"su -c \"{cmd}\"").strip()
-        except Exception:
-            result = ""
-
-        if not result:
-            continue
-
-        # Parsing berbagai kemungkinan format output
-        if "mLine1Number" in result:
-            match = re.search(r"mLine1Number\s*=\s*(\+?\d+)", result)
-            if match:
-                info["number"] = match.group(1)
-                break
-
-        elif "number=" in result:
-            match = re.search(r"number\s*=\s*(\+?\d+)", result)
-            if match:
-                info["number"] = match.group(1)
-                break
-
-        elif "Result:" in result or "Parcel" in result:
-            # service call iphonesubinfo biasanya return hex → decode
-            chars = re.findall(r"'(.*?)'", result)
-            if chars:
-                msisdn = ''.join(chars).replace('.', '').strip()
-                if msisdn and any(ch.isdigit() for ch in msisdn):
-                    info["number"] = msisdn
-                    break
+    info = {"number": None}
+
+    # 1. iphonesubinfo: satu call, hasil bertipe (nilai / null / exception)
+    res = call_iphonesubinfo(adb, "number", slot)
+    if not res.ok:
+        # exception (mis. SecurityException) atau service gagal → coba root sekali
+        res = call_iphonesubinfo(adb, "number", slot, root=True)
+    if res.ok and res.value and any(ch.isdigit() for ch in res.value):
+        info["number"] = res.value.strip()
+        return info
+
+    # 2. nomor tidak tersimpan di SIM / tidak ada akses: satu round trip dumpsys
+    try:
+        result = adb.shell(
+            "dumpsys telephony.registry | grep -m 1 'mLine1Number'; "
+            "dumpsys subscription | grep -m 1 'number'"
+        ) or ""
+    except Exception:
+        result = ""
 
-    # Jika tetap tidak ditemukan
-    if "number" not in info:
-        info["number"] = None
+    match = (
+        re.search(r"mLine1Number\s*=\s*(\+?\d+)", result)
+        or re.search(r"number\s*=\s*(\+?\d+)", result)
+    )
+    if match:
+        info["number"] = match.group(1)
 
     return info
 
-def capture_screenshot_base64(adb: AdbWrapper):
+def capture_screenshot_bytes(adb: AdbWrapper):
     remote = "/sdcard/bridgeservice_screenshot.png"
     local = os.path.join(os.getcwd(), "bridgeservice_screenshot.png")
     try:
@@ -391,236 +764,58 @@ def capture_screenshot_base64(adb: AdbWrapper):
         adb.pull(remote, local)
         if os.path.exists(local):
             with open(local, "rb") as f:
-                return base64.b64encode(f.read()).decode("ascii")
+                return f.read()
         out = adb.shell(f"cat {remote}") or ""
         if out:
-            b = out.encode('latin1') if isinstance(out, str) else out
-            return base64.b64encode(b).decode("ascii")
+            return out.encode('latin1') if isinstance(out, str) else out
     except Exception:
         pass
     return None
 
-# ----------------- USSD helper -----------------
-def _encode_ussd(code: str) -> str:
-    # encode '#' etc
-    return urllib.parse.quote(code, safe='')
-
-def focus_input_field(adb):
-    adb.shell("uiautomator dump /sdcard/tmp.xml")
-    xml = adb.shell("cat /sdcard/tmp.xml")
-
-    import xml.etree.ElementTree as ET
-    root = ET.fromstring(xml[xml.index("<?xml"):])
-
-    for node in root.iter("node"):
-        if node.attrib.get("resource-id") == "com.android.phone:id/input_field":
-            bounds = node.attrib.get("bounds")
-            nums = list(map(int, re.findall(r"\d+", bounds)))
-            x1, y1, x2, y2 = nums
-            cx, cy = (x1+x2)//2, (y1+y2)//2
-            adb.shell(f"input tap {cx} {cy}")
-            return True
-    return False
-
-def click_by_resource_id(adb, rid):
-    adb.shell("uiautomator dump /sdcard/tmp.xml")
-    xml = adb.shell("cat /sdcard/tmp.xml")
-
-    import xml.etree.ElementTree as ET
-    root = ET.fromstring(xml[xml.index("<?xml"):])
-
-    for node in root.iter("node"):
-        if node.attrib.get("resource-id") == rid:
-            bounds = node.attrib.get("bounds")
-            nums = list(map(int, re.findall(r"\d+", bounds)))
-            x1, y1, x2, y2 = nums
-            cx, cy = (x1+x2)//2, (y1+y2)//2
-            adb.shell(f"input tap {cx} {cy}")
-            return True
-    return False
-
-def pick_menu_by_keyword(message, keyword):
-    lines = message.splitlines()
-
-    for line in lines:
-        m = re.match(r"^\s*(\d+)[\.\)]\s*(.+)", line)
-        if not m:
-            continue
-
-        number = m.group(1)
-        text = m.group(2).lower()
-
-        if keyword.lower() in text:
-            return number
-
+def capture_screenshot_base64(adb: AdbWrapper):
+    data = capture_screenshot_bytes(adb)
+    if data:
+        return base64.b64encode(data).decode("ascii")
     return None
 
-def send_ussd_auto(adb, code, sim=0, keywords=None, timeout=20):
-    result = {
-        "ok": False,
-        "history": [],
-        "final": None,
-        "error": None
-    }
-
-    try:
-        if not code:
-            return {**result, "error": "USSD code kosong"}
-
-        keywords = keywords or []
-
-        # ================= DIAL =================
-        enc = _encode_ussd(code)
-        adb.shell(f'am start -a android.intent.action.CALL -d tel:{enc}')
-        time.sleep(1)
-
-        handle_sim_chooser(adb, sim)
-
-        step_index = 0
-
-        for _ in range(10):
-
-            # ================= WAIT UI =================
-            start = time.time()
-            message = None
-            xml = ""
-
-            while time.time() - start < timeout:
-                adb.shell("uiautomator dump /sdcard/ussd.xml")
-                xml = adb.shell("cat /sdcard/ussd.xml")
-
-                if not xml or "<?xml" not in xml:
-                    time.sleep(1)
-                    continue
-
-                import xml.etree.ElementTree as ET
-                root = ET.fromstring(xml[xml.index("<?xml"):])
-
-                for node in root.iter("node"):
-                    if node.attrib.get("resource-id") == "android:id/message":
-                        txt = (node.attrib.get("text") or "").strip()
-
-                        if not txt:
-                            continue
-
-                        # ❌ skip loading
-                        if any(k in txt.lower() for k in LOADING_KEYWORDS):
-                            message = None
-                            break
-
-                        message = txt
-                        break
-
-                if message:
-                    break
-
-                time.sleep(1)
-
-            if not message:
-                return {**result, "error": "tidak ada response ussd"}
-
-            result["history"].append(message)
-
-            # ================= ERROR =================
-            if any(k in message.lower() for k in ERROR_KEYWORDS):
-                adb.shell("input keyevent 4")
-                return {**result, "error": message}
-
-            # ================= FINAL (no input) =================
-            if "input_field" not in xml:
-                adb.shell("input keyevent 4")
-                return {
-                    **result,
-                    "ok": True,
-                    "final": message
-                }
-
-           # ================= PILIH MENU =================
-            choice = None
-
-            # hanya jalan kalau masih ada keyword
-            if step_index < len(keywords):
-                kw = keywords[step_index]
-                choice = pick_menu_by_keyword(message, kw)
-
-                print(f"[USSD AUTO] keyword: {kw} → choice: {choice}")
-
-                step_index += 1
-
-                # kalau keyword tidak ketemu → STOP
-                if not choice:
-                    print("[USSD AUTO] keyword tidak ditemukan, stop")
-                    adb.shell("input keyevent 4")
-                    return {
-                        **result,
-                        "ok": False,
-                        "error": f"keyword '{kw}' tidak ditemukan",
-                        "last_message": message
-                    }
-
-            else:
-                # ✅ keyword sudah habis → STOP tanpa kirim apa-apa
-                print("[USSD AUTO] step selesai, return hasil")
-
-                # coba klik tombol CANCEL / BATAL
-                closed = click_by_resource_id(adb, "android:id/button2")
-
-                # fallback kalau tidak ada tombol cancel
-                if not closed:
-                    print("[USSD] tombol CANCEL tidak ketemu, fallback BACK")
-                    adb.shell("input keyevent 4")
-
-                time.sleep(0.5)
-
-                return {
-                    **result,
-                    "ok": True,
-                    "final": message
-                }
-
-            # ================= INPUT (FIX) =================
-
-            # 1. fokus ke input
-            if not focus_input_field(adb):
-                print("[USSD] input field tidak ditemukan")
-                return {**result, "error": "input field tidak ditemukan"}
-
-            time.sleep(0.3)
-
-            # 2. CLEAR TEXT (WAJIB)
-            for _ in range(5):
-                adb.shell("input keyevent 67")  # DEL
-            time.sleep(0.3)
-
-            # 3. INPUT ANGKA
-            adb.shell(f'input text "{choice}"')
-            time.sleep(0.5)
-
-            # 4. VALIDASI INPUT MASUK
-            adb.shell("uiautomator dump /sdcard/check.xml")
-            xml_check = adb.shell("cat /sdcard/check.xml")
-
-            if choice not in xml_check:
-                print("[USSD] input tidak masuk, retry...")
-                
-                # retry sekali lagi
-                adb.shell(f'input text "{choice}"')
-                time.sleep(0.5)
-
-            # 5. KLIK SEND (WAJIB HARD CLICK)
-            clicked = click_by_resource_id(adb, "android:id/button1")
-
-            # fallback kalau gagal klik
-            if not clicked:
-                print("[USSD] tombol SEND tidak ketemu, fallback ENTER")
-                adb.shell("input keyevent 66")  # ENTER
-
-            time.sleep(2)            
-
-        return {**result, "error": "max step reached"}
-
-    except Exception as e:
-        return {**result, "error": str(e)}
+# ----------------- USSD helper -----------------
+def send_ussd_auto(adb, code, sim=0, keywords=None, timeout=20, operator=None, cache=None):
+    """
+    Jalankan USSD interaktif (menu dipilih per keyword) lewat UssdSession.
+    Dengan cache (UssdPathCache), jalur yang pernah berhasil dicoba dulu
+    sebagai kode berantai (*123*2*2#), selain itu pilihan tersimpan
+    di-replay. Response berbeda → jalur di-invalidate, kembali interaktif.
+    """
+    def session():
+        return UssdSession(adb, loading_keywords=LOADING_KEYWORDS, error_keywords=ERROR_KEYWORDS)
+
+    keywords = keywords or []
+    if cache is None or not keywords:
+        return session().run(code, sim, keywords, timeout)
+
+    key = cache.key(operator, sim, code, keywords)
+    entry = cache.get(key)
+
+    if entry and USSD_CHAIN and entry.get("chain") is not False:
+        chained = chain_ussd_code(code, entry["choices"])
+        if chained:
+            res = session().run(chained, sim, [], timeout)
+            if res["ok"] and cache.matches(entry, res):
+                cache.hit(key, chain=True)
+                return {**res, "choices": entry["choices"], "cached": "chain", "code": chained}
+            print(f"[USSD CACHE] response {chained} berbeda, kembali ke mode interaktif")
+            cache.invalidate(key, chain=False)
+            entry = None
+
+    res = session().run(code, sim, keywords, timeout, choices=entry["choices"] if entry else None)
+    if res["ok"]:
+        cache.record(key, res)
+        if entry and not res.get("replay_mismatch"):
+            cache.hit(key)
+            res["cached"] = "replay"
+    elif entry:
+        cache.invalidate(key)
+    return res
     
 # --- Fungsi helper untuk cellular call (standalone) ---
 def clean_phone_number(number):
@@ -785,37 +980,387 @@ def handle_sim_chooser(adb, sim_index: int):
         print("handle_sim_chooser error:", e)
         return False
 
+# ----------------- Batch helper -----------------
+def batch_key(item):
+    """Kunci grup batch: (platform, nomor tujuan, app, sim) — satu grup = satu set bucket."""
+    platform = str(item.get("platform", "")).upper()
+    number = re.sub(r'[^\d+]', '', str(item.get("to") or ""))
+    app = str(item.get("app") or platform).upper()
+    return (platform, number, app, str(item.get("sim", 0)))
+
+def group_batch_items(data_list, exclude=()):
+    """
+    Kelompokkan item payload locAndro berdasarkan batch_key.
+    Return list grup berisi (index, item); urutan grup mengikuti
+    kemunculan pertama, urutan item di dalam grup tetap.
+    exclude: index item yang tidak perlu masuk antrian.
+    """
+    groups = {}
+    for index, item in enumerate(data_list):
+        if not isinstance(item, dict) or index in exclude:
+            continue
+        groups.setdefault(batch_key(item), []).append((index, item))
+    return list(groups.values())
+
+def whatsapp_package(app):
+    return "com.whatsapp.w4b" if app == "WAB" else "com.whatsapp"
+
+def rate_limit_keys(item):
+    """Key token bucket untuk satu item: platform, slot SIM, dan app."""
+    platform = str(item.get("platform", "")).upper()
+    keys = [f"platform:{platform}"]
+    if platform in ("SMS", "TLC", "USSD"):
+        keys.append(f"sim:{item.get('sim', 0)}")
+    if platform in ("WAO", "WAB"):
+        keys.append(f"app:{item.get('app') or whatsapp_package(platform)}")
+    return keys
+
+def job_rate_keys(job):
+    """Gabungan key bucket semua item job (urutan kemunculan, tanpa duplikat)."""
+    keys = []
+    for _, item in job["items"]:
+        for key in rate_limit_keys(item):
+            if key not in keys:
+                keys.append(key)
+    return keys
+
+# ----------------- Result cache helper -----------------
+# TTL default (detik) hasil command read-only; item bisa override via
+# "cache_ttl", tandai manual via "readonly", atau opt-out via "no_cache"
+RESULT_CACHE_TTL = {"ADB": 10, "SS": 3}
+# command yang hanya membaca, boleh diikuti argumen apa pun
+READONLY_ADB_PREFIXES = (
+    "getprop", "dumpsys telephony.registry", "dumpsys wifi",
+    "settings get", "pm list", "pm path", "df", "uptime"
+)
+# command yang punya bentuk tulis (dumpsys battery set, wm size 720x1280,
+# ip route add, ...): hanya bentuk baca persisnya yang dianggap read-only
+READONLY_ADB_FORMS = re.compile(
+    r"dumpsys battery|wm (?:size|density)|ip (?:route|addr)(?: (?:show|list|get)(?: .*)?)?|cat /proc/\S+"
+)
+READONLY_PIPE_FILTERS = ("grep", "head", "tail", "wc", "sort", "cut", "uniq")
+
+def is_readonly_adb(cmd):
+    if re.search(r"[;&<>`]|\$\(", cmd):
+        return False
+    parts = [" ".join(p.split()) for p in cmd.split("|")]
+    head = parts[0]
+    if not (READONLY_ADB_FORMS.fullmatch(head)
+            or any(head == p or head.startswith(p + " ") for p in READONLY_ADB_PREFIXES)):
+        return False
+    return all(p.startswith(READONLY_PIPE_FILTERS) for p in parts[1:])
+
+def result_cache_ttl(item):
+    """TTL cache untuk item read-only; 0 berarti item tidak di-cache."""
+    platform = str(item.get("platform", "")).upper()
+    if platform not in RESULT_CACHE_TTL:
+        return 0
+    if item.get("no_cache") or item.get("cache") is False:
+        return 0
+
+    readonly = item.get("readonly")
+    if readonly is None:
+        readonly = platform == "SS" or is_readonly_adb(str(item.get("text") or "").strip())
+    if not readonly:
+        return 0
+
+    try:
+        return float(item.get("cache_ttl", RESULT_CACHE_TTL[platform]))
+    except (TypeError, ValueError):
+        return RESULT_CACHE_TTL[platform]
+
+def result_cache_key(item):
+    return (str(item.get("platform", "")).upper(), str(item.get("text") or "").strip())
+
 def log_print(msg, level="INFO"):
     ts = time.strftime("%Y-%m-%d %H:%M:%S")
     line = f"[{ts}] [{level}] {msg}"
     print(line, flush=True)
 
 # --- SMSHandler simplified ---
+# body terakhir: boleh berisi ", " / newline (lihat parse_content_rows)
+SMS_COLUMNS = ("_id", "thread_id", "address", "date", "read", "type", "status", "body")
+
+# GSM 03.38: karakter basic = 1 septet, extension = 2 septet (escape + char)
+GSM7_BASIC = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXT = set("^{}\\[~]|€\f")
+
+def _sms_units(text):
+    """(encoding, biaya per karakter) — gsm7 dalam septet, ucs2 dalam code unit UTF-16."""
+    if all(ch in GSM7_BASIC or ch in GSM7_EXT for ch in text):
+        return "gsm7", [2 if ch in GSM7_EXT else 1 for ch in text]
+    return "ucs2", [len(ch.encode("utf-16-le")) // 2 for ch in text]
+
+def sms_segments(text):
+    """Jumlah segmen SMS (160/153 septet GSM-7, 70/67 UCS-2 per segmen)."""
+    enc, units = _sms_units(text or "")
+    total = sum(units)
+    single, multi = (160, 153) if enc == "gsm7" else (70, 67)
+    return 1 if total <= single else -(-total // multi)
+
+def split_sms(text, max_parts):
+    """Pecah teks jadi beberapa kiriman, masing-masing <= max_parts segmen."""
+    if sms_segments(text) <= max_parts:
+        return [text]
+    enc, units = _sms_units(text)
+    size = (153 if enc == "gsm7" else 67) * max_parts
+    chunks, start, used = [], 0, 0
+    for i, cost in enumerate(units):
+        if used + cost > size:
+            chunks.append(text[start:i])
+            start, used = i, 0
+        used += cost
+    chunks.append(text[start:])
+    return chunks
+
 class SMSHandler:
     def __init__(self, wsclient, adb: AdbWrapper):
         self.ws = wsclient
         self.adb = adb
-        self.last_seen_ids = set()
+        self.source = SMS_SOURCE
+        self._content_failures = 0
+        self._content_retry_at = 0
+        state = self._load_state()
+        # _id SMS inbox terbesar yang sudah diteruskan (None = belum pernah jalan)
+        self.watermark = state.get("watermark")
+        self.last_seen_ids = SeenIds(SMS_SEEN_MAX, state.get("seen") or ())
+        # status SMS keluar, dari query yang sama dengan poll inbox
+        self.tracker = SmsStatusTracker(self.ws.send, timeout=SMS_TRACK_TIMEOUT)
+        self.scheduler = PollScheduler(
+            POLL_SMS_INTERVAL, SMS_POLL_MAX,
+            backoff=SMS_POLL_BACKOFF, expect_window=SMS_EXPECT_WINDOW
+        )
+
+    def _load_state(self):
+        try:
+            if os.path.exists(SMS_STATE_PATH):
+                with open(SMS_STATE_PATH, "r", encoding="utf-8") as f:
+                    return json.load(f)
+        except Exception as e:
+            log_print(f"SMS state load error: {e}", "WARN")
+        return {}
+
+    def _save_state(self):
+        try:
+            with open(SMS_STATE_PATH, "w", encoding="utf-8") as f:
+                json.dump({"watermark": self.watermark, "seen": self.last_seen_ids.to_list()}, f)
+        except Exception as e:
+            log_print(f"SMS state save error: {e}", "WARN")
 
-    def list_sms(self):
+    def list_sms(self, limit=None, offset=0):
+        cmd = ["termux-sms-list", "-t", "inbox"]
+        if limit:
+            cmd += ["-l", str(limit), "-o", str(offset)]
         try:
-            out = run_local("termux-sms-list")
+            out = run_local(cmd)
             return json.loads(out) if out else []
         except Exception:
             return []
 
+    @staticmethod
+    def _sms_id(m):
+        try:
+            return int(m.get("_id"))
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _row_to_sms(row):
+        """Baris content://sms/inbox → bentuk item termux-sms-list."""
+        try:
+            received = datetime.fromtimestamp(int(row["date"]) / 1000).strftime("%Y-%m-%d %H:%M:%S")
+        except (TypeError, ValueError):
+            received = row.get("date")
+        return {
+            "_id": int(row["_id"]),
+            "threadid": row.get("thread_id"),
+            "type": "inbox",
+            "read": row.get("read") == "1",
+            "number": row.get("address"),
+            "received": received,
+            "body": row.get("body") or ""
+        }
+
+    def _use_content(self):
+        if self.source == "auto":
+            return time.time() >= self._content_retry_at
+        return self.source == "content"
+
+    def _content_ok(self):
+        self._content_failures = 0
+
+    def _content_unavailable(self):
+        """Query content://sms gagal; mode auto pindah ke termux sementara setelah gagal berturut-turut."""
+        if self.source != "auto":
+            return
+        self._content_failures += 1
+        if self._content_failures < SMS_CONTENT_FAILS:
+            return
+        log_print(f"content://sms tidak bisa dibaca, fallback ke termux-sms-list {SMS_CONTENT_RETRY:.0f}s", "WARN")
+        self._content_failures = 0
+        self._content_retry_at = time.time() + SMS_CONTENT_RETRY
+        # tanpa content provider status kirim tidak bisa dilacak
+        self.tracker.expire(force=True)
+
+    def _latest_id(self):
+        """_id SMS terbaru (0 jika kosong)."""
+        if self._use_content():
+            rows = content_query(self.adb, "content://sms", ("_id",), sort="_id DESC")
+            if rows is not None:
+                self._content_ok()
+                return int(rows[0]["_id"]) if rows else 0
+            self._content_unavailable()
+        items = self.list_sms(1)
+        return (self._sms_id(items[0]) or 0) if items else 0
+
+    def fetch_new(self):
+        """
+        SMS inbox dengan _id > watermark (urut lama → baru) dan _id terbesar
+        yang terbaca. Mode content: satu query content://sms untuk semua box;
+        baris keluar (sent/outbox/failed, plus yang masih dipantau tracker)
+        diteruskan ke tracker.
+        """
+        after = self.watermark or 0
+        if self._use_content():
+            where = f"_id>{after}"
+            watch = self.tracker.watch_ids()
+            if watch:
+                where += f" OR _id IN ({','.join(map(str, watch))})"
+            rows = content_query(self.adb, "content://sms", SMS_COLUMNS, where=where, sort="_id ASC")
+            if rows is not None:
+                self._content_ok()
+                inbox = []
+                for r in rows:
+                    if r.get("type") == "1":
+                        inbox.append(self._row_to_sms(r))
+                    else:
+                        self.tracker.update(r)
+                return inbox, max((int(r["_id"]) for r in rows), default=None)
+            self._content_unavailable()
+
+        # termux-sms-list terbaru dulu: ambil per halaman sampai ketemu _id <= watermark
+        found = []
+        for page in range(SMS_MAX_PAGES):
+            items = self.list_sms(SMS_PAGE_SIZE, page * SMS_PAGE_SIZE)
+            newer = [
+                m for m in items
+                if (self._sms_id(m) or 0) > after
+                # Termux:API lama tanpa _id: dedup lewat last_seen_ids saja
+                or (self._sms_id(m) is None and self._legacy_key(m) not in self.last_seen_ids)
+            ]
+            found.extend(newer)
+            if len(newer) < len(items) or len(items) < SMS_PAGE_SIZE:
+                break
+        found.reverse()
+        return found, None
+
+    def track_send(self, request_id, index, number, text, message=None):
+        """Daftarkan SMS keluar ke tracker (sebelum kirim); False jika tidak bisa dilacak."""
+        if not self._use_content() or request_id is None:
+            return False
+        self.tracker.track(request_id, index, self._clean_phone_number(number),
+                           split_sms(text or "", SMS_MAX_PARTS), message)
+        self.scheduler.expect()
+        return True
+
+    @staticmethod
+    def _legacy_key(m):
+        return m.get('_id') or m.get('id') or m.get('date') or m.get('received')
+
     def send_sms(self, number, text, sim=0):
         sim_idx = int(sim) if sim is not None else 0
         number = self._clean_phone_number(number)
         self.ws.send({"type":"sms_debug","message":f"Sending SMS to {number} via SIM {sim_idx+1}"})
-        # Try termux-sms-send first (common in Termux)
+        return all(self._termux_send([number], part, sim_idx)["ok"] for part in split_sms(text or "", SMS_MAX_PARTS))
+
+    def _termux_send(self, numbers, text, sim):
+        """Satu termux-sms-send (argv, tanpa shell); -s memilih slot SIM."""
+        cmd = ["termux-sms-send", "-n", ",".join(numbers), "-s", str(sim), "--", text]
         try:
-            cmd = f'termux-sms-send -n {number} "{text}"'
-            run_local(cmd)
-            return True
-        except Exception:
-            pass
-        return False
+            proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+            err = proc.stderr.decode("utf-8", errors="ignore").strip()
+            if proc.returncode != 0:
+                return {"ok": False, "error": err or f"exit {proc.returncode}"}
+            return {"ok": True}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    def _bulk_entry(self, msg, sim):
+        if isinstance(msg, dict):
+            number, text, slot = msg.get("to") or msg.get("number"), msg.get("text"), msg.get("sim", sim)
+        else:
+            number, text, slot = msg[0], msg[1], sim
+        return self._clean_phone_number(number) if number else None, text, int(slot or 0)
+
+    def send_bulk(self, messages, sim=0, delay=SMS_BULK_DELAY, acquire=None):
+        """
+        Kirim banyak SMS [(number, text)] / [{"to","text","sim"}].
+        Satu lane berurutan per SIM, lane SIM berbeda jalan paralel. Pesan
+        berurutan dengan teks sama digabung jadi satu kiriman (-n a,b,...),
+        teks > SMS_MAX_PARTS segmen dipecah. acquire(slot) dipanggil sekali
+        per pesan sebelum dikirim (token rate limit, tanpa menunggu); False →
+        pesan itu dan sisa lane tidak dikirim dan ditandai deferred. Return
+        status per pesan (urutan input): {index, to, sim, parts, ok, error?},
+        atau {index, to, sim, text, ok: False, deferred: True}.
+        """
+        results = [None] * len(messages)
+        lanes = {}
+        for i, msg in enumerate(messages):
+            try:
+                number, text, slot = self._bulk_entry(msg, sim)
+            except (TypeError, ValueError, IndexError, KeyError):
+                number = text = None
+            if not number or not text:
+                results[i] = {"index": i, "ok": False, "error": "number/text kosong"}
+                continue
+            lanes.setdefault(slot, []).append((i, number, text))
+
+        def run_lane(slot, entries):
+            groups = []
+            for entry in entries:
+                last = groups[-1] if groups else None
+                if last and last[0][2] == entry[2] and len(last) < SMS_MERGE_MAX:
+                    last.append(entry)
+                else:
+                    groups.append([entry])
+
+            limited = False
+            for n, group in enumerate(groups):
+                granted = len(group)
+                if acquire:
+                    granted = 0
+                    while not limited and granted < len(group):
+                        if not acquire(slot):
+                            limited = True
+                            break
+                        granted += 1
+                    for i, number, text in group[granted:]:
+                        results[i] = {"index": i, "to": number, "sim": slot, "text": text,
+                                      "ok": False, "deferred": True}
+                    group = group[:granted]
+                    if not group:
+                        continue
+
+                if n and delay:
+                    time.sleep(delay)
+                text = group[0][2]
+                res = {"ok": True}
+                for part in split_sms(text, SMS_MAX_PARTS):
+                    res = self._termux_send([e[1] for e in group], part, slot)
+                    if not res["ok"]:
+                        break
+                for i, number, _ in group:
+                    results[i] = {"index": i, "to": number, "sim": slot, "parts": sms_segments(text), **res}
+
+        self.ws.send({"type":"sms_debug","message":f"Bulk SMS {len(messages)} pesan, SIM {sorted(lanes)}"})
+        if lanes:
+            with ThreadPoolExecutor(max_workers=len(lanes), thread_name_prefix="sms-lane") as pool:
+                for f in [pool.submit(run_lane, slot, entries) for slot, entries in lanes.items()]:
+                    f.result()
+        return results
 
     def _clean_phone_number(self, number):
         cleaned = re.sub(r'[^\d+]', '', str(number))
@@ -828,60 +1373,152 @@ class SMSHandler:
 
     def poll_loop(self):
         while True:
+            self.poll_once()
+            self.scheduler.wait(self.scheduler.next_delay())
+
+    def start_watcher(self):
+        """Watcher logcat SMS masuk → poll segera (jika logcat bisa dibaca)."""
+        if SMS_WATCH in ("", "off", "0", "false"):
+            return
+        threading.Thread(target=self._watch_loop, daemon=True).start()
+
+    def _watch_loop(self):
+        quick_exits = 0
+        # baris lama tidak memicu poll: logcat dimulai dari waktu start watcher,
+        # setelah restart dari baris terakhir yang terlihat (baris awal dengan
+        # timestamp itu sudah diproses, jadi dilewati)
+        now = time.time()
+        since = time.strftime("%m-%d %H:%M:%S", time.localtime(now)).encode() + b".%03d" % (now % 1 * 1000)
+        seen = None
+        while quick_exits < 3:
+            started = time.time()
+            buf, boundary = b"", seen
+            cmd = SMS_WATCH_CMD
+            if not re.search(r"\s-T\s", cmd):
+                cmd += f" -T {shlex.quote(since.decode())}"
             try:
-                msgs = self.list_sms()
-                new = []
+                for data in self.adb.shell_stream(cmd, timeout=None):
+                    # output datang per chunk: cocokkan per baris utuh
+                    *lines, buf = (buf + data).split(b"\n")
+                    for line in lines:
+                        if not line.strip() or line.startswith(b"---------"):
+                            continue
+                        m = LOGCAT_TIME.match(line)
+                        if m:
+                            if m.group(1) == boundary:
+                                continue
+                            boundary = None
+                            since = seen = m.group(1)
+                        if SMS_WATCH_PATTERN.search(line):
+                            self.scheduler.trigger()
+            except Exception as e:
+                log_print(f"SMS watcher error: {e}", "WARN")
+            # keluar cepat berulang = logcat tidak tersedia / ditolak
+            quick_exits = quick_exits + 1 if time.time() - started < 10 else 0
+            time.sleep(5)
+        log_print("SMS watcher berhenti, hanya poll adaptif", "WARN")
 
-                for m in msgs:
-                    mid = m.get('_id') or m.get('id') or m.get('date')
-                    if mid not in self.last_seen_ids:
-                        new.append(m)
-                        self.last_seen_ids.add(mid)
+    def poll_once(self):
+        try:
+            if self.watermark is None:
+                # start pertama: mulai dari SMS terbaru, inbox lama tidak diteruskan
+                self.watermark = self._latest_id()
+                self._save_state()
+                return 0
+
+            watermark = self.watermark
+            serial = self.ws._device_serial()
+            forwarded = 0
+            msgs, scanned = self.fetch_new()
+            for m in msgs:
+                mid = self._sms_id(m)
+                key = mid if mid is not None else self._legacy_key(m)
+                if not self.last_seen_ids.add(key):
+                    continue
+                forwarded += 1
+                try:
+                    sms_payload = dict(m)
+                    sms_payload["read"] = True
+                    sms_payload["forwarded"] = True
 
-                for m in reversed(new):
-                    try:
-                        sms_payload = dict(m)
-                        sms_payload["read"] = True
-                        sms_payload["forwarded"] = True
-
-                        self.ws.send({
-                            "type": "sms_received",
-                            "data": sms_payload,
-                            "serial": get_serial(self.adb)
-                        })
+                    self.ws.send({
+                        "type": "sms_received",
+                        "data": sms_payload,
+                        "serial": serial
+                    })
 
-                    except Exception as e:
-                        log_print(f"SMS send error: {e}", "ERROR")
+                except Exception as e:
+                    log_print(f"SMS send error: {e}", "ERROR")
+                if mid is not None and mid > watermark:
+                    watermark = mid
+            # baris keluar juga memajukan cursor (tidak dibaca ulang)
+            if scanned is not None and scanned > watermark:
+                watermark = scanned
+            self.tracker.expire()
 
-                if len(self.last_seen_ids) > 2000:
-                    self.last_seen_ids = set(list(self.last_seen_ids)[-1000:])
+            if forwarded or watermark != self.watermark:
+                self.watermark = watermark
+                self._save_state()
 
-            except Exception as e:
-                log_print(f"SMSHandler poll error: {e}", "ERROR")
+            self.scheduler.record(forwarded)
+            return forwarded
 
-            time.sleep(POLL_SMS_INTERVAL)
+        except Exception as e:
+            log_print(f"SMSHandler poll error: {e}", "ERROR")
+            self.scheduler.record(0)
+            return 0
 
 class WSClient:
-    def __init__(self, url):
+    def __init__(self, url, adb=None, startup_parts=None):
         self.url = url
         self.ws = None
-        self.adb = AdbWrapper()
+        # adb & profil dari pipeline startup main() dipakai ulang jika ada
+        self.adb = adb or AdbWrapper()
         self.sms = SMSHandler(self, self.adb)
      
         self.ui_call = None
+        self.server_caps = {}
+        self._binary_seq = 0
+        # PNG screenshot terakhir per seq, untuk ack yang frame binernya hilang
+        self._binary_shots = OrderedDict()
+        self.result_cache = ResultCache()
+        self.ussd_paths = None
+        if USSD_PATH_CACHE.lower() not in ("", "off"):
+            self.ussd_paths = UssdPathCache(USSD_PATH_CACHE, match_ratio=USSD_CHAIN_MATCH)
+        self.telemetry = QueueTelemetry()
+        self._serial = None
         self._stop = threading.Event()
         self.wa = None
         self.reconnect_attempt = 0
+        self._connected_at = None
+        # token dari server untuk melanjutkan sesi setelah reconnect
+        self.session_token = None
+        self._profile = self._load_profile()
+        self._profile_lock = threading.Lock()
+        self.hb_delta = HeartbeatDelta(HEARTBEAT_KEYFRAME_EVERY)
+
+        # device info di-refresh di background; open & heartbeat baca snapshot
+        self.profile_service = ProfileService(
+            {
+                "static": lambda: get_static_info(self.adb),
+                "sim": lambda: get_sim_card_info(self.adb),
+                "fast": lambda: get_network_info(self.adb)
+            },
+            assemble_device_info,
+            sim_key_fn=lambda: _safe_shell(self.adb, "getprop gsm.sim.state"),
+            fast_interval=PROFILE_FAST_INTERVAL,
+            sim_check_interval=PROFILE_SIM_CHECK,
+            sim_max_age=PROFILE_SIM_MAX_AGE,
+            on_change=self._on_profile_change
+        )
+        if startup_parts:
+            self.profile_service.seed(startup_parts)
+            self._profile = build_profile(startup_parts, self._device_serial())
+            self._save_profile(self._profile)
 
-        self.command_queue = Queue()
+        # antrian dengan rate limit: job menunggu token, bukan gagal
+        self.command_queue = JobScheduler(job_rate_keys, RATE_LIMITS)
 
-        # worker thread
-        self.worker_thread = threading.Thread(
-            target=self._command_worker,
-            daemon=True
-        )
-        self.worker_thread.start()
-        
         try:
             self.wa = WhatsAppAutomation(self.adb, app="business")
             self.ui_call = UICallController(self.adb)
@@ -900,16 +1537,72 @@ class WSClient:
         # Variabel untuk melacak status koneksi
         self.ws_connected = False
         self._connection_lock = threading.Lock()
-        
-        # start heartbeat thread (tapi tunggu koneksi dulu)
-        self._hb_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
-        self._hb_thread.start()
+
+        # semua tulis ke socket lewat satu writer thread; pesan penting yang
+        # gagal terkirim (WS putus) disimpan di outbox dan di-replay saat open
+        self.outbox = Outbox(OUTBOX_PATH, max_messages=OUTBOX_MAX, max_age=OUTBOX_MAX_AGE)
+        self.writer = WSWriter(self._write_frame, on_fail=self._on_write_failed)
+
+        # mode asyncio: writer, heartbeat & poll SMS jadi task di event loop
+        # transport; mode thread: masing-masing thread sendiri
+        self.transport = None
+        if WS_TRANSPORT == "asyncio" and ASYNC_WS_AVAILABLE:
+            self.transport = AsyncWSTransport(
+                self, url,
+                heartbeat_interval=HEARTBEAT_INTERVAL or 1800
+            )
+        else:
+            self.writer.start()
+
+            # start heartbeat thread (tapi tunggu koneksi dulu)
+            self._hb_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+            self._hb_thread.start()
+
+        self.profile_service.start()
+
+        # journal job di disk: job yang belum selesai dari run sebelumnya
+        # dimasukkan lagi ke antrian. Paling akhir, setelah wa / ui_call /
+        # writer / outbox siap, supaya job replay tidak gagal "not ready"
+        self.journal = None
+        self._abandoned_jobs = []
+        if JOB_JOURNAL_PATH.lower() != "off":
+            try:
+                self.journal = JobJournal(JOB_JOURNAL_PATH, replay=JOB_REPLAY)
+                replay, self._abandoned_jobs = self.journal.recover()
+                for job in replay:
+                    job["enqueued_at"] = time.time()
+                    self.command_queue.put(job)
+                if replay or self._abandoned_jobs:
+                    log_print(f"Journal recover: {len(replay)} replay, {len(self._abandoned_jobs)} abandoned ({JOB_REPLAY})")
+                self.journal.start()
+            except Exception as e:
+                log_print(f"JobJournal disabled: {e}", "WARN")
+                self.journal = None
+
+        # worker thread
+        self.worker_thread = threading.Thread(
+            target=self._command_worker,
+            daemon=True
+        )
+        self.worker_thread.start()
+
+    def background(self, fn):
+        """Kerja blocking sekali jalan: executor transport asyncio, atau thread baru (mode thread)."""
+        if self.transport:
+            self.transport.executor.submit(fn)
+        else:
+            threading.Thread(target=fn, daemon=True).start()
 
     def log(self, message, level="INFO"):
         ts = time.strftime("%Y-%m-%d %H:%M:%S")
         print(f"[{ts}] [{level}] {message}")
 
     def start(self):
+        self.sms.start_watcher()
+        if self.transport:
+            log_print("WS transport: asyncio")
+            self.transport.start()
+            return
         t = threading.Thread(target=self._run, daemon=True)
         t.start()
         t2 = threading.Thread(target=self.sms.poll_loop, daemon=True)
@@ -917,6 +1610,12 @@ class WSClient:
 
     def stop(self):
         self._stop.set()
+        self.writer.stop()
+        self.profile_service.stop()
+        if self.transport:
+            self.transport.stop()
+        self._on_write_failed(self.writer.drain_pending())
+        self.outbox.persist()
         with self._connection_lock:
             self.ws_connected = False
         try:
@@ -926,66 +1625,246 @@ class WSClient:
             pass
 
     def send(self, data):
+        """Antrikan pesan ke writer thread; tidak pernah menunggu socket."""
         try:
-            # Selalu sertakan serial jika belum ada
-            try:
-                serial = get_serial(self.adb)
-                if isinstance(data, dict) and 'serial' not in data:
-                    data = {**data, "serial": serial}
-            except Exception:
-                pass
+            if isinstance(data, dict):
+                data = dict(data)
+                # Selalu sertakan serial jika belum ada
+                data.setdefault("serial", self._device_serial())
+                # id untuk dedup di server kalau pesan di-replay dari outbox
+                if self._is_outboxable(data):
+                    Outbox.ensure_id(data)
 
-            payload = json.dumps(data)
-            
+            self.writer.put(data)
 
-            # Cek apakah WebSocket sudah terhubung
-            with self._connection_lock:
-                if not self.ws_connected:
-                    print(f"⏳ WebSocket not connected, skipping send for: {data.get('type', 'unknown')}")
-                    return
+        except Exception as e:
+            print(f"❌ WS send exception: {e}")
 
-            # Pastikan koneksi WebSocket sudah siap
-            if (
-                self.ws 
-                and hasattr(self.ws, "sock") 
-                and self.ws.sock 
-                and getattr(self.ws.sock, "connected", False)
-            ):
-                try:
-                    self.ws.send(payload)
-                    print(f"✅ WS sent: {data.get('type', 'unknown')}")  # log lebih ringkas
-                except Exception as e:
-                    print(f"⚠️ WS send failed for {data.get('type', 'unknown')}: {e}")
-                    # Coba update status koneksi
-                    with self._connection_lock:
-                        self.ws_connected = False
-            else:
-                print(f"⏳ WebSocket socket not ready, skipping: {data.get('type', 'unknown')}")
+    @property
+    def binary_enabled(self):
+        return bool(self.server_caps.get("binary"))
+
+    def send_binary(self, ftype, payload, cls=WSWriter.AUDIO, **header):
+        """Antrikan frame biner (WSCodec); hanya dipakai jika server mendukung binary."""
+        try:
+            self.writer.put(encode_frame(ftype, payload, **header), cls=cls)
+        except Exception as e:
+            print(f"❌ WS binary send exception: {e}")
+
+    def _next_binary_seq(self):
+        self._binary_seq += 1
+        return self._binary_seq
+
+    def _write_frame(self, frame, msgs):
+        """Dipanggil writer thread untuk satu frame (bisa berisi beberapa pesan)."""
+        kinds = ",".join(sorted({
+            str(m.get("type") or m.get("event") or "unknown") if isinstance(m, dict) else "binary"
+            for m in msgs
+        }))
+
+        # Cek apakah WebSocket sudah terhubung
+        with self._connection_lock:
+            if not self.ws_connected:
+                return False
+
+        # Pastikan koneksi WebSocket sudah siap
+        if (
+            self.ws 
+            and hasattr(self.ws, "sock") 
+            and self.ws.sock 
+            and getattr(self.ws.sock, "connected", False)
+        ):
+            try:
+                if isinstance(frame, BinaryFrame):
+                    self.ws.send(frame, opcode=websocket.ABNF.OPCODE_BINARY)
+                else:
+                    # bytes UTF-8 dari codec dikirim langsung sebagai frame teks
+                    self.ws.send(frame)
+                if kinds not in ("audio_chunk", "binary"):
+                    print(f"✅ WS sent: {kinds}")  # log lebih ringkas
+                return True
+            except Exception as e:
+                print(f"⚠️ WS send failed for {kinds}: {e}")
+                # Coba update status koneksi
                 with self._connection_lock:
                     self.ws_connected = False
+        else:
+            print(f"⏳ WebSocket socket not ready, skipping: {kinds}")
+            with self._connection_lock:
+                self.ws_connected = False
+        return False
 
-        except Exception as e:
-            print(f"❌ WS send exception for {data.get('type', 'unknown')}: {e}")
+    def _is_outboxable(self, msg):
+        # hello milik satu koneksi; hello berikutnya sudah membawa profil terbaru.
+        # result_chunk tidak di-outbox: memori stream dibatasi window in-flight
+        if isinstance(msg, dict) and msg.get("type") in ("hello", "profile", "result_chunk"):
+            return False
+        return isinstance(msg, dict) and self.writer.classify(msg) in (WSWriter.ACK, WSWriter.SMS)
+
+    def _unbinary_ack(self, msg):
+        """
+        Ack screenshot biner yang masuk outbox diubah ke bentuk base64: frame
+        binernya (seq) tidak ikut outbox dan seq tidak berlaku di koneksi baru.
+        """
+        payload = msg.get("payload") if msg.get("type") == "ack" else None
+        result = payload.get("result") if isinstance(payload, dict) else None
+        binary = result.get("binary") if isinstance(result, dict) else None
+        if not isinstance(binary, dict):
+            return msg
+        data = self._binary_shots.pop(binary.get("seq"), None)
+        if data:
+            res = {"ok": True, "msg": base64.b64encode(data).decode("ascii")}
+        else:
+            res = {"ok": False, "msg": "screenshot frame lost"}
+        return {**msg, "status": "success" if res["ok"] else "failed",
+                "payload": {**payload, "result": res}}
+
+    def _on_write_failed(self, msgs):
+        """Pesan ack/sms yang gagal terkirim masuk outbox; audio & heartbeat dibuang."""
+        keep = [self._unbinary_ack(m) for m in msgs if self._is_outboxable(m)]
+        for m in keep:
+            self.outbox.add(m)
+        if keep:
+            print(f"📦 Outbox +{len(keep)} (total {len(self.outbox)})")
+        elif msgs:
+            print(f"⏳ WebSocket not connected, dropped {len(msgs)} realtime message(s)")
+
+    def _flush_outbox(self, head=(), on_queued=None):
+        """Replay outbox berurutan di depan antrian writer (didahului head) setelah koneksi terbuka."""
+        msgs = self.outbox.drain()
+        for m in msgs:
+            if isinstance(m, dict):
+                m["replayed"] = True
+        self.writer.put_front(list(head) + msgs, on_queued)
+        if msgs:
+            log_print(f"📦 Outbox replay {len(msgs)} message(s)")
+
+    def _apply_server_caps(self, payload):
+        """Capability dari server (balasan hello) untuk fitur protokol opsional."""
+        caps = payload.get("capabilities") or payload
+        self.server_caps = dict(caps) if isinstance(caps, dict) else {}
+        self.writer.batch_enabled = bool(self.server_caps.get("batch"))
+
+        # permessage-deflate dari transport asyncio sudah mengompres semua frame
+        enc = self.server_caps.get("compress")
+        if enc in available_compressors() and not (self.transport and self.transport.deflate):
+            self.writer.compressor = PayloadCompressor(enc, COMPRESS_THRESHOLD, binary=self.binary_enabled)
+        else:
+            self.writer.compressor = None
+
+        token = payload.get("session") or self.server_caps.get("session")
+        if token:
+            self.session_token = token
+        if payload.get("resumed"):
+            log_print("Session resumed")
+
+        log_print(f"Server capabilities: {self.server_caps}")
+
+        # server sudah memproses hello: baru kirim profil lengkap jika berubah
+        self._refresh_profile()
 
     def _on_open(self, ws):
         log_print("WebSocket connected")
-        self.reconnect_attempt = 0
+        self._connected_at = time.time()
+
+        # capability baru aktif setelah server membalas
+        self.server_caps = {}
+        self.writer.batch_enabled = False
+        self.writer.compressor = None
+        self.hb_delta.reset()
+
+        # kirim profil cache dulu (tanpa adb) supaya langsung bisa terima
+        # command; profil lengkap menyusul dari _refresh_profile
+        serial = self._device_serial()
+        profile = self._profile or {"platform": "termux", "serial": serial}
+        hello = {
+            "type":"hello",
+            "message":"device online update data",
+            "id":str(uuid.uuid4()),
+            "info":profile,
+            "serial":serial,
+            "cached": True,
+            "capabilities": CLIENT_CAPABILITIES
+        }
+        if self.session_token:
+            hello["resume"] = self.session_token
+
+        # hello + replay outbox masuk depan antrian dalam satu put_front, dan
+        # koneksi baru ditandai siap di dalamnya: writer tidak bisa mengambil
+        # (lalu membuang) hello sebelum ws_connected, hello selalu frame pertama
+        self._flush_outbox(head=[hello], on_queued=self._mark_connected)
+
+        if self._abandoned_jobs:
+            self._report_abandoned_jobs()
+
+    def _mark_connected(self):
         with self._connection_lock:
             self.ws_connected = True
-        
-        device_info = get_device_info(self.adb)
-        ip_local = get_local_ip(self.adb)
-        serial = get_serial(self.adb)
-        sim1 = {"imei": get_imei(self.adb, 0), **get_sim_info(self.adb, 0)}
-        sim2 = {"imei": get_imei(self.adb, 1), **get_sim_info(self.adb, 1)}
-        profile = {"platform":"termux","device":device_info,"serial":serial,"ip_local":ip_local}
-        self.send({"type":"heartbeat", "message":"device online update data","id":str(uuid.uuid4()),"info":profile,"serial":serial})
+
+    def _load_profile(self):
+        try:
+            if os.path.exists(PROFILE_CACHE_PATH):
+                with open(PROFILE_CACHE_PATH, "r", encoding="utf-8") as f:
+                    return json.load(f)
+        except Exception as e:
+            log_print(f"Profile cache load error: {e}", "WARN")
+        return None
+
+    def _on_profile_change(self, tier):
+        # sinyal / jaringan cukup lewat heartbeat, bukan update profil
+        if tier != "fast":
+            self._refresh_profile()
+
+    def _save_profile(self, profile):
+        try:
+            with open(PROFILE_CACHE_PATH, "w", encoding="utf-8") as f:
+                json.dump(profile, f)
+        except Exception as e:
+            log_print(f"Profile cache save error: {e}", "WARN")
+
+    def _refresh_profile(self):
+        """Ambil snapshot ProfileService; kirim update jika berbeda dari cache."""
+        device_info = self.profile_service.snapshot()
+        if not device_info:
+            return
+        with self._profile_lock:
+            serial = self._device_serial()
+            profile = {"platform":"termux","device":device_info,"serial":serial,"ip_local":device_info.get("iplocal")}
+
+            if profile == self._profile:
+                return
+            self._profile = profile
+            self._save_profile(profile)
+
+            if self.ws_connected:
+                self.send({
+                    "type":"profile",
+                    "message":"device online update data",
+                    "id":str(uuid.uuid4()),
+                    "info":profile,
+                    "serial":serial
+                })
+
+    def _next_reconnect_delay(self):
+        """
+        0 hanya untuk retry pertama setelah koneksi stabil putus; selain itu
+        exponential backoff dengan full jitter (attempt berikutnya langsung
+        masuk rentang jitter, jadi tidak ada dua retry seketika).
+        """
+        stable = self._connected_at and time.time() - self._connected_at >= RECONNECT_STABLE
+        self._connected_at = None
+        if stable:
+            self.reconnect_attempt = 0
+            return 0
+
+        ceiling = min(RECONNECT_MAX, RECONNECT_BASE * 2 ** max(0, self.reconnect_attempt - 1))
+        return random.uniform(0, ceiling)
 
     def _on_message(self, ws, message):
 
         try:
 
-            payload = json.loads(message)
+            payload = json_loads(message)
 
             msg_type = payload.get("type")
             sender = payload.get("from")      # siapa yang kirim
@@ -995,6 +1874,31 @@ class WSClient:
             print("FROM:", sender)
             print("REQUEST_ID:", request_id)
 
+            if msg_type in ("capabilities", "hello"):
+                self._apply_server_caps(payload)
+                return
+
+            if msg_type == "heartbeat_ack":
+                self.hb_delta.ack(payload.get("version"))
+                if payload.get("keyframe"):
+                    self.hb_delta.request_keyframe()
+                return
+
+            if msg_type == "heartbeat_keyframe":
+                # server kehilangan state: kirim keyframe sekarang (adb di background)
+                self.hb_delta.request_keyframe()
+                self.background(lambda: self.send(self._build_heartbeat(-1)))
+                return
+
+            if msg_type == "stats":
+                self.send({
+                    "type": "stats",
+                    "to": sender,
+                    "request_id": request_id,
+                    "data": self._stats_snapshot()
+                })
+                return
+
             # hanya proses command
             if msg_type != "command":
                 return
@@ -1010,19 +1914,33 @@ class WSClient:
                 self._send_ws_error("invalid_payload", "data harus array", sender, request_id)
                 return
 
-            for item in data_list:
+            # command read-only yang masih ada di cache langsung dijawab
+            cached = self._answer_from_cache(data_list, sender, request_id)
+
+            # item untuk device lain tidak masuk antrian (tidak memakai token
+            # rate limit device ini)
+            serial = self._device_serial()
+            skip = set(cached) | {
+                index for index, item in enumerate(data_list)
+                if isinstance(item, dict) and not self._is_local_item(item, serial)
+            }
+
+            # item dengan (platform, nomor, app, sim) sama digabung jadi satu job,
+            # supaya setup (buka chat, popup, login) cukup sekali per grup
+            for group in group_batch_items(data_list, exclude=skip):
 
                 job = {
-                    "item": item,
+                    "id": str(uuid.uuid4()),
+                    "items": group,
                     "sender": sender,
                     "request_id": request_id
                 }
 
-                self.command_queue.put(job)
+                self._enqueue_job(job)
 
-                print("📥 QUEUE COMMAND:", item.get("platform"))
+                print("📥 QUEUE COMMAND:", group[0][1].get("platform"), f"x{len(group)}")
 
-        except json.JSONDecodeError as e:
+        except JSON_DECODE_ERRORS as e:
 
             print("❌ JSON error:", e)
 
@@ -1042,18 +1960,210 @@ class WSClient:
                 None
             )
 
-    def _handle_locandro_item(self, ws, item: dict, to_user, request_id):
+    def _answer_from_cache(self, data_list, to_user, request_id):
+        """Kirim ack dari cache untuk item read-only; return set index yang terjawab."""
+        answered = set()
+        for index, item in enumerate(data_list):
+            if not isinstance(item, dict) or not result_cache_ttl(item):
+                continue
+            hit = self.result_cache.get(result_cache_key(item))
+            if hit is None or not self._is_local_item(item):
+                continue
+
+            res, age = hit
+            platform = item.get("platform", "").upper()
+            self._send_item_ack(
+                item, platform, {**res, "cached": True, "age": round(age, 2)},
+                to_user, request_id, index
+            )
+            answered.add(index)
+        return answered
+
+    def _device_serial(self):
+        if not self._serial:
+            self._serial = get_serial(self.adb)
+        return self._serial
+
+    def _enqueue_job(self, job):
+        job["enqueued_at"] = time.time()
+        if self.journal:
+            self.journal.record(job)
+        self.command_queue.put(job)
+        self.telemetry.job_enqueued(self.command_queue.qsize())
+
+    def _record_timing(self, platform, enqueued_at, started, finished=None):
+        """Catat wait (enqueue → mulai) dan service (mulai → ack) per platform."""
+        finished = finished or time.time()
+        self.telemetry.record(platform, started - (enqueued_at or started), finished - started)
+
+    def _sim_operator(self, sim):
+        """Nama operator SIM slot (dari snapshot profil, tanpa adb jika sudah ada)."""
+        device_info = self.profile_service.snapshot() or {}
+        operators = (device_info.get("cardinfo") or {}).get("operator") or get_operator(self.adb)
+        try:
+            return operators[int(sim or 0)] if len(operators) > 1 else (operators or [None])[0]
+        except (IndexError, ValueError, TypeError):
+            return None
+
+    def _stats_snapshot(self):
+        return {
+            **self.telemetry.snapshot(self.command_queue.qsize()),
+            "cache": self.result_cache.stats(),
+            "writer": self.writer.stats(),
+            "outbox": self.outbox.stats(),
+            "profile_age": self.profile_service.stats(),
+            "sms_poll": self.sms.scheduler.stats(),
+            "sms_tracking": self.sms.tracker.stats(),
+            "ussd_paths": self.ussd_paths.stats() if self.ussd_paths else None
+        }
+
+    def _bulk_token_fn(self, item):
+        """
+        acquire(slot) untuk send_bulk: satu token platform:SMS + sim:<slot>
+        per pesan. Token yang sudah diambil job untuk item ini menutup pesan
+        pertama di slot item.
+        """
+        credit = {int(item.get("sim", 0) or 0): 1}
+        lock = threading.Lock()
+
+        def acquire(slot):
+            with lock:
+                if credit.get(slot):
+                    credit[slot] -= 1
+                    return True
+            job = {"items": [(0, {"platform": "SMS", "sim": slot})]}
+            return self.command_queue.try_acquire(job)
+        return acquire
+
+    def _acquire_next(self, index, item):
+        """Token untuk item berikutnya dalam grup (item pertama sudah dapat dari scheduler)."""
+        return self.command_queue.try_acquire({"items": [(index, item)]})
+
+    def _defer_rest(self, rest, to_user, request_id):
+        """Sisa item grup yang belum dapat token dijadikan job baru di antrian."""
+        job = {
+            "id": str(uuid.uuid4()),
+            "items": rest,
+            "sender": to_user,
+            "request_id": request_id
+        }
+        self._enqueue_job(job)
+        self.log(f"⏳ rate limit: {len(rest)} item {rest[0][1].get('platform')} ditunda")
+
+    def _job_progress(self, job_id, done):
+        if self.journal and job_id:
+            self.journal.mark_progress(job_id, done)
+
+    def _report_abandoned_jobs(self):
+        """Kirim ack gagal untuk job yang terputus saat run sebelumnya."""
+        jobs, self._abandoned_jobs = self._abandoned_jobs, []
+        for job in jobs:
+            for index, item in job.get("items", []):
+                self._send_ws_ack(
+                    "failed",
+                    {
+                        "device": item.get("device"),
+                        "platform": item.get("platform", "").upper(),
+                        "index": index,
+                        "result": {"ok": False, "msg": "job terputus (service restart)"}
+                    },
+                    job.get("sender"),
+                    job.get("request_id")
+                )
+
+    def _is_local_item(self, item: dict, serial=None):
         device = item.get("device")
         connection = item.get("connection", "").upper()
-        platform = item.get("platform", "").upper()
-        serial = get_serial(self.adb)
 
         # 🔒 FILTER CONNECTION
         if connection != "TERMUX":
             self.log(f"⏭ skip device {device} (connection={connection})")
-            return      
+            return False
+
+        if serial is None:
+            serial = self._device_serial()
+        return serial == device
+
+    def _handle_locandro_batch(self, ws, items, to_user, request_id, job_id=None, enqueued_at=None):
+        """
+        Jalankan satu grup item dari payload yang sama.
+        items: list (index, item) dengan (platform, nomor, app, sim) yang sama.
+        """
+        platform = items[0][1].get("platform", "").upper()
+
+        if len(items) == 1 or platform not in ("WAO", "WAB"):
+            for n, (index, item) in enumerate(items):
+                if n and not self._acquire_next(index, item):
+                    self._defer_rest(items[n:], to_user, request_id)
+                    return
+                started = time.time()
+                if self._handle_locandro_item(ws, item, to_user, request_id, index):
+                    self._record_timing(platform, enqueued_at, started)
+                self._job_progress(job_id, n + 1)
+            return
+
+        serial = self._device_serial()
+        positions = [n for n, (_, item) in enumerate(items) if self._is_local_item(item, serial)]
+        local = [items[n] for n in positions]
+        if not local:
+            return
+
+        self.log(f"📦 [{serial}] {platform} batch x{len(local)} → {local[0][1].get('to')}")
+
+        for _, item in local:
+            item["status"] = "processing"
+
+        # setup chat ikut dihitung ke service time item pertama
+        item_started = [time.time()]
+        acked = set()
+
+        def on_result(i, res):
+            index, item = local[i]
+            acked.add(i)
+            self._send_item_ack(item, platform, res, to_user, request_id, index)
+            now = time.time()
+            self._record_timing(platform, enqueued_at, item_started[0], now)
+            item_started[0] = now
+            # progress dihitung terhadap items asli (termasuk yang di-skip)
+            self._job_progress(job_id, positions[i] + 1)
+
+        def should_continue(i):
+            return self._acquire_next(*local[i])
+
+        try:
+            results = self.process_whatsapp_batch(
+                [item for _, item in local],
+                on_result=on_result,
+                should_continue=should_continue
+            )
+            if len(results) < len(local):
+                self._defer_rest(local[len(results):], to_user, request_id)
+        except Exception as e:
+            # satu ack gagal per item yang belum di-ack, dengan index-nya
+            for i, (index, item) in enumerate(local):
+                if i not in acked:
+                    self._send_item_ack(item, platform, {"ok": False, "msg": str(e)}, to_user, request_id, index)
+
+    def _send_item_ack(self, item, platform, res, to_user, request_id, index=None):
+        status = "success" if res.get("ok", True) else "failed"
+
+        self._send_ws_ack(
+            status,
+            {
+                "device": item.get("device"),
+                "platform": platform,
+                "index": index,
+                "result": res
+            },
+            to_user,
+            request_id
+        )
+
+    def _handle_locandro_item(self, ws, item: dict, to_user, request_id, index=None):
+        device = item.get("device")
+        platform = item.get("platform", "").upper()
 
-        if(serial == device):
+        if self._is_local_item(item):
             try:
                 self.log(f"📞 [{device}] {platform} → {item.get('to')}")
 
@@ -1067,16 +2177,18 @@ class WSClient:
                     res = self.process_telepon_selular(item)
 
                 elif platform == "SMS":
-                    res = self.process_sms(item)
+                    res = self.process_sms(item, request_id, index, to_user)
 
                 elif platform == "ADB":
-                    res = self.process_adbshell(item)
+                    res = self.process_adbshell(item, self._chunk_sender(item, platform, to_user, request_id, index))
+                    self._cache_result(item, res)
 
                 elif platform == "CMD":
-                    res = self.process_cmd(item)
+                    res = self.process_cmd(item, self._chunk_sender(item, platform, to_user, request_id, index))
 
                 elif platform == "SS":
-                    res = self.process_ssb(item)
+                    res = self.process_ssb(item, request_id)
+                    self._cache_result(item, res)
 
                 elif platform == "USSD":
                     code = item.get("text")
@@ -1084,12 +2196,17 @@ class WSClient:
                     keywords = item.get("auto", [])
 
                     try:
-                        res = send_ussd_auto(self.adb, code, sim, keywords)
-
-                        self.ws.send(json.dumps({
+                        res = send_ussd_auto(
+                            self.adb, code, sim, keywords,
+                            operator=self._sim_operator(sim), cache=self.ussd_paths
+                        )
+                        # balasan USSD sering berupa SMS
+                        self.sms.scheduler.expect()
+
+                        self.send({
                             "event": "ussd_result",
                             "data": res
-                        }))
+                        })
 
                     except Exception as e:
                         res = {"ok": False, "msg": str(e)}
@@ -1098,18 +2215,7 @@ class WSClient:
                     res = {"ok": False, "msg": "unknown platform"}
 
 
-                status = "success" if res.get("ok", True) else "failed"
-
-                self._send_ws_ack(
-                    status,
-                    {
-                        "device": device,
-                        "platform": platform,
-                        "result": res
-                    },
-                    to_user,
-                    request_id
-                )        
+                self._send_item_ack(item, platform, res, to_user, request_id, index)
 
             except Exception as e:
                  self._send_ws_ack(
@@ -1118,28 +2224,129 @@ class WSClient:
                     to_user,
                     request_id
                 )
+
+            return True
+
+        return False
     
+    def _chunk_sender(self, item, platform, to_user, request_id, index=None):
+        """
+        Callback on_chunk(seq, text) → pesan result_chunk untuk item ini.
+        Return False jika stream dibatalkan (WS putus > STREAM_PAUSE_MAX).
+        """
+        def on_chunk(seq, text):
+            # WS putus: tahan producer sampai tersambung lagi, jangan menumpuk chunk
+            deadline = time.time() + STREAM_PAUSE_MAX
+            while not self.ws_connected:
+                if time.time() >= deadline or self._stop.is_set():
+                    return False
+                time.sleep(0.5)
+            # backpressure: jangan menumpuk chunk di memori kalau socket lambat
+            self.writer.wait_room(WSWriter.ACK, STREAM_MAX_INFLIGHT, timeout=30)
+            self.send({
+                "type": "result_chunk",
+                "to": to_user,
+                "request_id": request_id,
+                "payload": {
+                    "device": item.get("device"),
+                    "platform": platform,
+                    "index": index,
+                    "seq": seq,
+                    "data": text
+                }
+            })
+            return True
+        return on_chunk
+
+    def _stream_output(self, chunks, on_chunk=None, force=False):
+        """
+        Baca output bertahap. Selama total <= RESULT_INLINE_MAX hasilnya
+        dikembalikan utuh di msg; setelah itu (atau jika force) output dikirim
+        lewat on_chunk dan ack hanya membawa total chunk/byte. on_chunk
+        mengembalikan False → stream dibatalkan (sumber ditutup).
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        buf, buf_size = [], 0
+        seq = total = 0
+        streaming = force and on_chunk is not None
+
+        def flush():
+            nonlocal seq, buf_size
+            text = "".join(buf)
+            buf.clear()
+            buf_size = 0
+            if text:
+                if on_chunk(seq, text) is False:
+                    return False
+                seq += 1
+            return True
+
+        def aborted():
+            # menutup generator sumber ikut mematikan proses di belakangnya
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+            return {"ok": False, "msg": "stream aborted: websocket disconnected",
+                    "streamed": True, "chunks": seq, "bytes": total}
+
+        try:
+            for data in chunks:
+                total += len(data)
+                buf.append(decoder.decode(data))
+                buf_size += len(data)
+                if not streaming and on_chunk and buf_size > RESULT_INLINE_MAX:
+                    streaming = True
+                if streaming and buf_size >= STREAM_CHUNK_SIZE and not flush():
+                    return aborted()
+            buf.append(decoder.decode(b"", final=True))
+        except Exception as e:
+            if not streaming:
+                return {"ok": False, "msg": str(e)}
+            if not flush():
+                return aborted()
+            return {"ok": False, "msg": str(e), "streamed": True, "chunks": seq, "bytes": total}
+
+        if not streaming:
+            return {"ok": True, "msg": "".join(buf)}
+        if not flush():
+            return aborted()
+        return {"ok": True, "msg": "", "streamed": True, "chunks": seq, "bytes": total}
+
+    def _cache_result(self, item, res):
+        ttl = result_cache_ttl(item)
+        # hasil yang dikirim sebagai frame biner tidak bisa diulang dari cache
+        if ttl and res.get("ok") and res.get("msg") and "binary" not in res:
+            self.result_cache.put(result_cache_key(item), res, ttl)
+
     def _command_worker(self):
 
         print("🧵 Worker started")
 
         while True:
 
+            job = {}
+
             try:
 
                 job = self.command_queue.get()
 
                 print("⚙️ Worker processing job")
 
-                item = job["item"]
+                items = job["items"]
                 sender = job["sender"]
                 request_id = job["request_id"]
+                job_id = job.get("id")
+
+                if self.journal and job_id:
+                    self.journal.mark_started(job_id)
 
-                self._handle_locandro_item(
+                self._handle_locandro_batch(
                     self.ws,
-                    item,
+                    items,
                     sender,
-                    request_id
+                    request_id,
+                    job_id,
+                    job.get("enqueued_at")
                 )
 
             except Exception as e:
@@ -1148,6 +2355,9 @@ class WSClient:
 
             finally:
 
+                if self.journal and job and job.get("id"):
+                    self.journal.mark_finished(job["id"])
+
                 self.command_queue.task_done()
                         
     def _send_ws_ack(self, status, payload, to_user, request_id):
@@ -1160,21 +2370,9 @@ class WSClient:
             "payload": payload
         }
 
-        try:
-
-            with self._connection_lock:
-
-                if not self.ws_connected:
-                    print("⚠️ ACK skipped (WS disconnected)")
-                    return
-
-            self.ws.send(json.dumps(msg))
-
-            print("📤 ACK SENT:", status)
-
-        except Exception as e:
+        self.send(msg)
 
-            print("❌ ACK send error:", e)
+        print("📤 ACK QUEUED:", status)
 
     def _send_ws_error(self, error, message, to_user=None, request_id=None):
 
@@ -1189,10 +2387,7 @@ class WSClient:
         if to_user:
             msg["to"] = to_user
 
-        try:
-            self.ws.send(json.dumps(msg))
-        except:
-            pass
+        self.send(msg)
 
     def durasi_to_seconds(self, d):
 
@@ -1215,109 +2410,157 @@ class WSClient:
         return 0
 
     def process_whatsapp(self, item):
-
-        number = item.get("to")
-        permission = item.get("permission")
-        app = item.get("platform", "WAB")
-        delay = item.get("delay", 25)
+        return self.process_whatsapp_batch([item])[0]
+
+    def process_whatsapp_batch(self, items, on_result=None, should_continue=None):
+        """
+        Proses beberapa item WhatsApp ke nomor & app yang sama dalam satu sesi chat.
+        Buka chat, validasi login dan popup hanya sekali per grup.
+        on_result(i, res) dipanggil setiap item selesai; return list hasil per item.
+        should_continue(i) dicek sebelum item ke-i (i >= 1); jika False batch
+        berhenti dan hasil yang dikembalikan lebih pendek dari items.
+        """
+        results = []
+
+        def done(res):
+            if on_result:
+                on_result(len(results), res)
+            results.append(res)
+            return res
+
+        number = items[0].get("to")
+        app = items[0].get("platform", "WAB")
+        permissions = [it.get("permission") for it in items]
 
         if not self.wa:
-            return {"ok": False, "msg": "WhatsAppAutomation not ready"}
+            for _ in items:
+                done({"ok": False, "msg": "WhatsAppAutomation not ready"})
+            return results
 
         try:
 
             self.wa.app = app
-            self.wa.package = "com.whatsapp.w4b" if app=="WAB" else "com.whatsapp"
+            self.wa.package = whatsapp_package(app)
 
-            if permission == "call":
+            has_call = "call" in permissions
 
-                call_type = item.get("type","voice")
+            if has_call or "message" in permissions:
 
                 self.wa.open_whatsapp_chat(number)
-                time.sleep(0.5)
+                time.sleep(0.5 if has_call else 1)
 
                 # VALIDASI LOGIN
-                if not self.wa.ensure_logged_in():
-                    return {"ok": False, "msg": "WhatsApp belum login"}
+                if has_call and not self.wa.ensure_logged_in():
+                    for _ in items:
+                        done({"ok": False, "msg": "WhatsApp belum login"})
+                    return results
 
                 if self.wa.handle_not_registered_popup():
-                    return {"ok": False, "msg": f"Nomor {number} tidak terdaftar"}
+                    for _ in items:
+                        done({"ok": False, "msg": f"Nomor {number} tidak terdaftar"})
+                    return results
 
-                self.wa.handle_privacy_popup()
+                if has_call:
+                    self.wa.handle_privacy_popup()
 
-                self.wa.click_call(call_type)
-                time.sleep(1)
+            entry_ready = False
 
-                self.wa.handle_call_popup()
-                # tunggu screen call muncul
-                if not self.wa.wait_voip_screen():
-                    self.wa.click_call(call_type)
-                    # return {"ok": False, "msg": "VOIP screen tidak muncul"}
+            for i, item in enumerate(items):
+                if i and should_continue and not should_continue(i):
+                    break
 
-                get_call_status = self.wa.get_call_status()   
+                permission = item.get("permission")
+                try:
+                    if permission == "call":
+                        done(self._whatsapp_call(item))
+                        # setelah call, kolom input perlu dibuka lagi
+                        entry_ready = False
 
-                # start timer
-                call_start = time.time()
+                    elif permission == "message":
+                        if not entry_ready:
+                            self.wa.toggle_entry()
 
-                time.sleep(delay)
+                            self.wa._tap_button(
+                                "e2ee_description_close_button",
+                                desc_keywords=["tutup", "end", "panggilan"]
+                            )
+                            entry_ready = True
 
-                call_seconds = int(time.time() - call_start)
+                        done(self._whatsapp_message(item))
 
-                durasi = f"{call_seconds//60:02d}:{call_seconds%60:02d}"
+                    else:
+                        done({"ok": False, "msg": "permission tidak dikenal", "number": number})
 
-                self.wa.wake_any_call_screen()                
-                self.wa._tap_button("end_call_button")
+                except Exception as e:
+                    done({"ok": False, "msg": str(e)})
 
-                seconds = self.durasi_to_seconds(durasi)
+            return results
 
-                if seconds >= 10:
-                    return {
-                        "ok": True,
-                        "msg": "Panggilan WhatsApp berhasil",
-                        "duration": durasi,
-                        "call_status": get_call_status,
-                        "number": number
-                    }
-                else:
-                    return {
-                        "ok": True,
-                        "msg": "Durasi panggilan terlalu singkat",
-                        "duration": durasi,
-                        "call_status": get_call_status,
-                        "number": number
-                    }
-                
-            elif permission == "message":
+        except Exception as e:
 
-                text = item.get("text")
+            for _ in items[len(results):]:
+                done({"ok": False, "msg": str(e)})
+            return results
 
-                self.wa.open_whatsapp_chat(number)
-                time.sleep(1)
+    def _whatsapp_call(self, item):
+        number = item.get("to")
+        call_type = item.get("type","voice")
+        delay = item.get("delay", 25)
 
-                if self.wa.handle_not_registered_popup():
-                    return {"ok": False, "msg": f"Nomor {number} tidak terdaftar"}
+        self.wa.click_call(call_type)
+        time.sleep(1)
 
-                self.wa.toggle_entry()
+        self.wa.handle_call_popup()
+        # tunggu screen call muncul
+        if not self.wa.wait_voip_screen():
+            self.wa.click_call(call_type)
+            # return {"ok": False, "msg": "VOIP screen tidak muncul"}
 
-                self.wa._tap_button(
-                    "e2ee_description_close_button",
-                    desc_keywords=["tutup", "end", "panggilan"]
-                )
+        get_call_status = self.wa.get_call_status()   
 
-                self.wa.type_text_like_human(text)
+        # start timer
+        call_start = time.time()
 
-                time.sleep(delay)
+        time.sleep(delay)
 
-                self.wa.send_message()
+        call_seconds = int(time.time() - call_start)
 
-                return {"ok": True, "msg": "Pesan WhatsApp berhasil", "number": number}
+        durasi = f"{call_seconds//60:02d}:{call_seconds%60:02d}"
 
-            else:
-                return {"ok": False, "msg": "permission tidak dikenal", "number": number}
+        self.wa.wake_any_call_screen()                
+        self.wa._tap_button("end_call_button")
 
-        except Exception as e:
+        seconds = self.durasi_to_seconds(durasi)
+
+        if seconds >= 10:
+            return {
+                "ok": True,
+                "msg": "Panggilan WhatsApp berhasil",
+                "duration": durasi,
+                "call_status": get_call_status,
+                "number": number
+            }
+        else:
+            return {
+                "ok": True,
+                "msg": "Durasi panggilan terlalu singkat",
+                "duration": durasi,
+                "call_status": get_call_status,
+                "number": number
+            }
 
-            return {"ok": False, "msg": str(e)}   
+    def _whatsapp_message(self, item):
+        number = item.get("to")
+        text = item.get("text")
+        delay = item.get("delay", 25)
+
+        self.wa.type_text_like_human(text)
+
+        time.sleep(delay)
+
+        self.wa.send_message()
+
+        return {"ok": True, "msg": "Pesan WhatsApp berhasil", "number": number}
 
     def process_telepon_selular(self, item):
         number = item.get("to")
@@ -1354,43 +2597,101 @@ class WSClient:
                 "number": number
             }
     
-    def process_sms(self, item):           
+    def process_sms(self, item, request_id=None, index=None, to_user=None):
         permission = item.get("permission")       
         delay = item.get("delay")         
 
         if permission == "message":  
-            n = item.get("to"); t = item.get("text"); s = item.get("sim", 0)
-            self.sms.send_sms(n, t, s)
-            time.sleep(delay)
-            return {"ok": True, "msg": "SMS berhasil", "number": n}
+            # status terkirim menyusul sebagai event sms_status (request_id, index[, message])
+            # bulk: {"messages": [{"to","text","sim"?}, ...]} → satu ack berisi status per pesan.
+            # Pesan tanpa token rate limit tidak ditunggu: sisanya jadi job baru
+            # (ack berikutnya, index sama; "positions" = posisi di messages asli)
+            if item.get("messages"):
+                messages = item["messages"]
+                positions = item.get("positions") or list(range(len(messages)))
+                tracked = False
+                for i, msg in enumerate(messages):
+                    try:
+                        number, text, _ = self.sms._bulk_entry(msg, 0)
+                    except (TypeError, ValueError, IndexError, KeyError):
+                        continue
+                    if number and text:
+                        tracked = self.sms.track_send(request_id, index, number, text, positions[i]) or tracked
+                results = self.sms.send_bulk(messages, item.get("sim", 0), SMS_BULK_DELAY if delay is None else delay,
+                                             acquire=self._bulk_token_fn(item))
+                self.sms.scheduler.expect()
+                for r in results:
+                    r["index"] = positions[r["index"]]
+                    if not r["ok"]:
+                        self.sms.tracker.forget(request_id, index, r["index"])
+
+                deferred = [r for r in results if r.get("deferred")]
+                results = [r for r in results if not r.get("deferred")]
+                if deferred:
+                    rest = {
+                        **item,
+                        "sim": deferred[0]["sim"],
+                        "messages": [{"to": r["to"], "text": r["text"], "sim": r["sim"]} for r in deferred],
+                        "positions": [r["index"] for r in deferred]
+                    }
+                    self._defer_rest([(index, rest)], to_user, request_id)
+                sent = sum(1 for r in results if r["ok"])
+                return {"ok": sent == len(results), "msg": f"SMS terkirim {sent}/{len(results)}",
+                        "results": results, "tracking": tracked, "deferred": len(deferred)}
 
-    def process_adbshell(self, item):
-        serial = get_serial(self.adb)
+            n = item.get("to"); t = item.get("text"); s = item.get("sim", 0)
+            tracked = bool(n and t) and self.sms.track_send(request_id, index, n, t)
+            ok = self.sms.send_sms(n, t, s)
+            self.sms.scheduler.expect()
+            if not ok:
+                self.sms.tracker.forget(request_id, index)
+            # pacing antar SMS dari token bucket sim:<slot> (RATE_LIMITS), tanpa sleep di worker
+            return {"ok": ok, "msg": "SMS berhasil" if ok else "SMS gagal", "number": n,
+                    "tracking": tracked and ok}
+
+    def process_adbshell(self, item, on_chunk=None):
         cmd = item.get("text", "")
         out = ""
-        try:
-          out = self.adb.shell(cmd)
-          return {"ok": True, "msg": out}
-        except Exception as e:
-          out = str(e)
-          return {"ok": False, "msg": out}
+        # stream: true → selalu result_chunk; stream: false → output utuh di memori
+        if item.get("stream") is False or on_chunk is None:
+          try:
+            out = self.adb.shell(cmd)
+            return {"ok": True, "msg": out}
+          except Exception as e:
+            out = str(e)
+            return {"ok": False, "msg": out}
+        return self._stream_output(self.adb.shell_stream(cmd), on_chunk, force=bool(item.get("stream")))
         
-    def process_cmd(self, item):
-        serial = get_serial(self.adb)
+    def process_cmd(self, item, on_chunk=None):
         cmd = item.get("text", "")
         out = ""
-        try:
-          out = run_local(cmd)
-          return {"ok": True, "msg": out}
-        except Exception as e:
-          out = str(e)
-          return {"ok": False, "msg": out}
-
-    def process_ssb(self, item):
-        serial = get_serial(self.adb)
+        if item.get("stream") is False or on_chunk is None:
+          try:
+            out = run_local(cmd)
+            return {"ok": True, "msg": out}
+          except Exception as e:
+            out = str(e)
+            return {"ok": False, "msg": out}
+        return self._stream_output(run_local_stream(cmd), on_chunk, force=bool(item.get("stream")))
+
+    def process_ssb(self, item, request_id=None):
         cmd = item.get("text", "")
         out = ""
         try:
+          # mode biner: PNG mentah dikirim sebagai frame sebelum ack
+          if self.binary_enabled and self.ws_connected:
+            data = capture_screenshot_bytes(self.adb)
+            if data:
+              seq = self._next_binary_seq()
+              self._binary_shots[seq] = data
+              while len(self._binary_shots) > 4:
+                  self._binary_shots.popitem(last=False)
+              self.send_binary(FRAME_SCREENSHOT, data, WSWriter.ACK, seq=seq, fmt="png", request_id=request_id)
+              return {
+                  "ok": True,
+                  "msg": "binary",
+                  "binary": {"type": "screenshot", "seq": seq, "format": "png", "bytes": len(data)}
+              }
           out = capture_screenshot_base64(self.adb)
           return {"ok": True, "msg": out}
         except Exception as e:
@@ -1445,6 +2746,8 @@ class WSClient:
     def _restart_service(self):
         try:
             self.stop()
+            if self.journal:
+                self.journal.flush()
             time.sleep(1)
             script_path = os.path.abspath(__file__)
             os.execv(sys.executable, [sys.executable, script_path])
@@ -1481,8 +2784,9 @@ class WSClient:
             except Exception as e:
                 log_print(f"WS run error: {e}", "ERROR")
 
-            log_print("Reconnecting in 5 seconds...", "WARN")
-            time.sleep(5)
+            delay = self._next_reconnect_delay()
+            log_print(f"Reconnecting in {delay:.1f} seconds...", "WARN")
+            self._stop.wait(delay)
 
     def _heartbeat_loop(self):
         """Loop heartbeat yang hanya mengirim jika WebSocket terhubung"""
@@ -1502,14 +2806,7 @@ class WSClient:
                         heartbeat_count += 1
                         continue
                 
-                serial = get_serial(self.adb)
-                device_info = get_device_info(self.adb)
-                payload = {
-                    "type": "heartbeat",
-                    "device_info": device_info,
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
-                    "count": heartbeat_count
-                }
+                payload = self._build_heartbeat(heartbeat_count)
                 print(f"❤️ Sending heartbeat #{heartbeat_count}")
                 self.send(payload)
                 heartbeat_count += 1
@@ -1518,12 +2815,28 @@ class WSClient:
                 print(f"💔 Heartbeat error: {e}")
                 time.sleep(60)  # Tunggu lebih singkat jika error
 
+    def _build_heartbeat(self, count):
+        state = {
+            "device_info": self.profile_service.snapshot() or get_device_info(self.adb),
+            "rate_limit": self.command_queue.snapshot(),
+            "stats": self._stats_snapshot()
+        }
+        payload = {
+            "type": "heartbeat",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "count": count
+        }
+        # server yang mendukung delta menerima keyframe / merge patch + version
+        if self.server_caps.get("heartbeat_delta"):
+            payload.update(self.hb_delta.encode(state))
+        else:
+            payload.update(state)
+        return payload
+
 def main():
     print("🚀 Starting Bridge Service...")
 
-        # 🔹 Jalankan register dulu
     from register import register_device
-    register_device()
 
     adb = AdbWrapper()
     # Ambil serial perangkat
@@ -1534,8 +2847,16 @@ def main():
 
     print(f"🔍 Mengecek status perangkat serial: {serial}")
 
-    # Cek ke server apakah serial aktif
-    respon = check_device_status(serial)
+    # Cek status ke server sambil mengumpulkan profil sekali; profil yang
+    # sama dipakai registrasi dan WS hello (satu Session HTTP)
+    session = http_session()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        status_future = pool.submit(check_device_status, serial, session)
+        parts = collect_device_parts(adb)
+        profile = {**build_profile(parts, serial), "sims": parts["slots"]}
+        register_future = pool.submit(register_device, adb, profile, session)
+        respon = status_future.result() or {}
+        register_future.result()
     
     username = respon.get("username")
     is_active = respon.get("active")
@@ -1553,7 +2874,7 @@ def main():
     # Jalankan WS
     #  client
     ws_url = f"wss://ws.autocall.my.id/ws?username={username}"
-    client = WSClient(ws_url)
+    client = WSClient(ws_url, adb=adb, startup_parts=parts)
     client.start()
 
     try:
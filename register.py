@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 import json
-import requests
 import subprocess
 import socket
 import sys
@@ -14,10 +13,10 @@ sys.path.append(ROOT)
 
 try:
     from bridgeservice import (
-        get_device_info,
-        get_sim_info,
+        collect_device_parts,
+        build_profile,
+        http_session,
         get_serial,
-        get_local_ip,
         AdbWrapper
     )
 except Exception as e:
@@ -28,32 +27,23 @@ except Exception as e:
 # ===============================================
 # Kirim data registrasi
 # ===============================================
-def register_device():
-    adb = AdbWrapper()
+def register_device(adb=None, profile=None, session=None):
+    """
+    Kirim profil registrasi. main() bridgeservice memberi adb, profil dan
+    Session yang sudah ada; dijalankan langsung, semuanya dikumpulkan di sini.
+    """
+    if profile is None:
+        adb = adb or AdbWrapper()
 
-    # Ambil serial
-    serial = get_serial(adb)
-    if not serial:
-        print("❌ Serial perangkat tidak ditemukan")
-        return
+        # Ambil serial
+        serial = get_serial(adb)
+        if not serial:
+            print("❌ Serial perangkat tidak ditemukan")
+            return
 
-    # Ambil info device
-    device_info = get_device_info(adb)
-
-    # Ambil info SIM
-    sim1 = get_sim_info(adb, 0)
-    sim2 = get_sim_info(adb, 1)
-
-    # Ambil IP lokal
-    ip_local = get_local_ip(adb)
-
-    profile = {
-        "platform": "termux",
-        "device": device_info,
-        "serial": serial,
-        "ip_local": ip_local,
-        "sims": [sim1, sim2]
-    }
+        # Ambil info device + SIM per slot (satu fan-out probe)
+        parts = collect_device_parts(adb)
+        profile = {**build_profile(parts, serial), "sims": parts["slots"]}
 
     #print("📡 Mengirim data registrasi ke server...")
     #print(json.dumps(profile, indent=2, ensure_ascii=False))
@@ -62,7 +52,7 @@ def register_device():
     url = "https://mrjay59.com/api/cpost/device/register"
 
     try:
-        r = requests.post(url, json=profile, timeout=10)
+        r = (session or http_session()).post(url, json=profile, timeout=10)
         if r.status_code == 200:
           # print("✅ Registrasi berhasil!")
             print("Server response:", r.text)